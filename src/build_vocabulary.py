@@ -1,14 +1,16 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-import PyPDF2, re, pickle
+import PyPDF2, re, sys
 import pandas as pd
 from pathlib import Path
-from wordentry import WordEntry, Session
+from wordentry import WordEntry, MasterSession, Vocabulary, save_session
+from storage import SQLiteStorage
+from deckfile import write_deck
 
 here = Path(__file__).parent
 
-def main():
+def main(database=None):
     magoosh_reader, magoosh_pages, magoosh_wrap = retrieve_pages()
     sections = fetch_sections(magoosh_pages)
     vocab_draft, wrong_words = build_vocabulary_draft(sections, 
@@ -17,7 +19,7 @@ def main():
     vocab_corr = address_incorrect_words(vocab_draft, wrong_words)
     vocab_corr_2 = post_hoc_additions(vocab_corr)
     vocab_corr_3 = post_hoc_corrections(vocab_corr_2)
-    export(vocab_corr_3)
+    export(vocab_corr_3, database)
     magoosh_wrap.close()
 
 
@@ -175,13 +177,23 @@ def post_hoc_corrections(vocabulary):
     vocabulary['denote'].example = "Even if the text is not visible, the red octagon denotes \"stop\" to all motorists in America."
     return vocabulary
 
-def export(vocabulary):
+def export(vocabulary, database=None):
     # ## Finally, export vocabulary object as a pickle
-    with open(here.parent / 'game_data' / 'vocabulary.obj', 'wb') as f:
-        pickle.dump(vocabulary, f)
-    
-    with open(here.parent / 'game_data' / 'master_session.obj', 'wb') as f:
-        pickle.dump(Session(vocabulary), f)
+    # Entry ids are positions in the Vocabulary: sessions saved against it
+    # store ids, so re-exporting with a different word order invalidates them
+    vocabulary = Vocabulary(vocabulary.values())
+    save_session(vocabulary, here.parent / 'game_data' / 'vocabulary.obj')
+    # Same entries as a memory-mappable deck, which the game opens if present
+    write_deck(vocabulary, here.parent / 'game_data' / 'vocabulary.deck')
+    # Only words that can be played go to the pool sessions are drawn from.
+    # The pool keeps ids only, so the game decodes a deck card once drawn
+    save_session(MasterSession(entry.id for entry in vocabulary if vocabulary.is_valid(entry)),
+                 here.parent / 'game_data' / 'master_session.obj', vocabulary)
+
+    # Optionally fill a SQLite database for the 'sqlite' storage of the game
+    if database is not None:
+        SQLiteStorage(database, vocabulary).close()
 
 if __name__ == "__main__":
-    main()
+    # python build_vocabulary.py [path/to/valebulary.db]
+    main(*sys.argv[1:2])
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+"""Read-only binary vocabulary decks, opened with mmap so that startup does 
+not depend on the size of the deck.
+
+Layout of a deck file (all integers little-endian unsigned):
+	header:       magic b'VBDK', version (2 bytes), number of fields (2 bytes),
+	              number of entries (4 bytes)
+	offset table: (entries * fields + 1) offsets of 4 bytes into the blob; 
+	              field f of entry i spans offsets[i*fields+f] to the next one
+	valid table:  one byte per entry, 1 if the entry can be played (since 
+	              version 2)
+	fingerprint:  20 bytes, SHA-1 of the keys of the entries, the digest of 
+	              Vocabulary.fingerprint() (since version 3)
+	blob:         UTF-8 text of every field of every entry, back to back
+"""
+import mmap
+import struct
+import sys
+from pathlib import Path
+from wordentry import *
+
+magic = b'VBDK'
+version = 3
+fields = ('word', 'category', 'meaning', 'example', 'difficulty')
+header = struct.Struct('<4sHHI')
+
+def write_deck(vocabulary, path):
+	"""Write the entries of a Vocabulary as a deck. Entry ids are kept, since 
+	ids are positions in both"""
+	offsets = [0]
+	blob = bytearray()
+	for entry in vocabulary:
+		for field in fields:
+			blob += getattr(entry, field).encode('utf-8')
+			offsets.append(len(blob))
+	with open(path, 'wb') as f:
+		f.write(header.pack(magic, version, len(fields), len(vocabulary)))
+		f.write(struct.pack('<{}I'.format(len(offsets)), *offsets))
+		f.write(bytes(entry.is_valid() for entry in vocabulary))
+		f.write(bytes.fromhex(vocabulary.fingerprint()[1]))
+		f.write(blob)
+
+class MappedEntry(WordEntry):
+	"""WordEntry living in a deck file. Word, category and difficulty are 
+	decoded when the entry is first looked up; meaning and example are read
+	from the deck every time they are used"""
+	__slots__ = ('deck',)
+
+	@property
+	def meaning(self):
+		return self.deck.field(self.id, 2)
+
+	@property
+	def example(self):
+		return self.deck.field(self.id, 3)
+
+class MappedVocabulary(Vocabulary):
+	"""Vocabulary read from a deck file. Entries are only decoded when looked
+	up by id, e.g. when a card is drawn or shown in the gallery"""
+	__slots__ = ('path', 'file', 'map', 'n_fields', 'n_entries', 'blob_start',
+				'cache', 'key_index')
+
+	def __init__(self, path):
+		self.path = Path(path)
+		self.file = open(self.path, 'rb')
+		self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		file_magic, file_version, self.n_fields, self.n_entries = \
+			header.unpack_from(self.map, 0)
+		if file_magic != magic or file_version not in (1, 2, version):
+			raise ValueError('{} is not a version {} deck'.format(path, version))
+		self.blob_start = header.size + 4*(self.n_entries*self.n_fields + 1)
+		if file_version >= 2:
+			self.valid = self.map[self.blob_start:self.blob_start+self.n_entries]
+			self.blob_start += self.n_entries
+		else:
+			self.valid = None
+		if file_version >= 3:
+			self.digest = self.map[self.blob_start:self.blob_start+20].hex()
+			self.blob_start += 20
+		else:
+			self.digest = None
+		self.cache = {}
+		self.key_index = None
+
+	def __repr__(self):
+		return 'Vocabulary with {} entries mapped from {}'.format(self.n_entries, self.path)
+
+	def __reduce__(self):
+		return (MappedVocabulary, (self.path,))
+
+	def __len__(self):
+		return self.n_entries
+
+	def __iter__(self):
+		for entry_id in range(self.n_entries):
+			yield self[entry_id]
+
+	def __getitem__(self, entry_id):
+		entry = self.cache.get(entry_id)
+		if entry is None:
+			if not 0 <= entry_id < self.n_entries:
+				raise IndexError('Entry id out of range')
+			entry = MappedEntry.__new__(MappedEntry)
+			entry.deck = self
+			entry.id = entry_id
+			entry.word = sys.intern(self.field(entry_id, 0))
+			entry.category = sys.intern(self.field(entry_id, 1))
+			entry.difficulty = sys.intern(self.field(entry_id, 4))
+			entry.is_known = False
+			self.cache[entry_id] = entry
+		return entry
+
+	def __contains__(self, entry):
+		return entry.key in self.keys()
+
+	def field(self, entry_id, field):
+		"""Decode one field of an entry straight from the deck"""
+		start, stop = struct.unpack_from('<2I', self.map, 
+			header.size + 4*(entry_id*self.n_fields + field))
+		return self.map[self.blob_start+start:self.blob_start+stop].decode('utf-8')
+
+	def keys(self):
+		"""Key -> id index, only built if some entry needs to be looked up by key"""
+		if self.key_index is None:
+			self.key_index = {}
+			for entry_id in range(self.n_entries):
+				key = (self.field(entry_id, 0), self.field(entry_id, 1))
+				self.key_index.setdefault(key, entry_id)
+		return self.key_index
+
+	def add(self, entry):
+		raise TypeError('Deck files are read-only')
+
+	def fingerprint(self):
+		if self.digest is None:
+			# Older decks have no fingerprint: work it out once
+			self.digest = key_digest((self.field(entry_id, 0), self.field(entry_id, 1)) 
+				for entry_id in range(self.n_entries))
+		return (self.n_entries, self.digest)
+
+	def is_valid_id(self, entry_id):
+		if self.valid is None:
+			# Version 1 decks have no valid table: work it out once
+			self.valid = bytes(self[i].is_valid() for i in range(self.n_entries))
+		return super().is_valid_id(entry_id)
+
+	def difficulty(self, entry_id):
+		entry = self.cache.get(entry_id)
+		if entry is not None:
+			return entry.difficulty
+		return sys.intern(self.field(entry_id, 4))
+
+	def canonical(self, entry):
+		if entry.id is not None and entry.id < len(self) and self[entry.id] is entry:
+			return entry
+		entry_id = self.keys().get(entry.key)
+		return entry if entry_id is None else self[entry_id]
+
+def load_deck_or_vocabulary(directory):
+	"""Open vocabulary.deck from directory if there is one, otherwise load 
+	vocabulary.obj"""
+	directory = Path(directory)
+	if (directory / 'vocabulary.deck').exists():
+		return MappedVocabulary(directory / 'vocabulary.deck')
+	return load_vocabulary(directory / 'vocabulary.obj')
+
+if __name__ == "__main__":
+	# Convert a pickled vocabulary into a deck:
+	# python deckfile.py game_data/vocabulary.obj game_data/vocabulary.deck
+	write_deck(load_vocabulary(sys.argv[1]), sys.argv[2])
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""The rules of the game without any display, so that they can be played by
+the pygame front end as well as by scripts and simulations"""
+import random
+import sys
+import time
+from wordentry import *
+
+class GameEngine():
+	"""One player going through the cards of a GameProgress.
+	The engine is always in one of these states:
+	- 'guessing': a card is on the table. The player can submit_guess(),
+	  reveal_letter(), show_example(), skip() or give_up()
+	- 'solved': the word was guessed. next() deals the next card
+	- 'failed': the word was not guessed in max_attempts or the player gave
+	  up. next() deals the next card
+	- 'complete': the word was guessed and it was the last one of the session.
+	  next() archives the session, starts a new one and deals its first card
+	- 'finished': there is no word left to play at all
+	Calling a method that makes no sense in the current state raises ValueError"""
+	max_attempts = 7
+
+	def __init__(self, progress):
+		self.progress = progress
+		self.state = None
+		self.entry = None
+		self.rounds = 0
+		self.progress.start()
+		self.deal()
+
+	def __repr__(self):
+		return 'GameEngine({}, {})'.format(self.state, self.entry)
+
+	def expect(self, *states):
+		if self.state not in states:
+			raise ValueError('Not possible while the game is {}'.format(self.state))
+
+	def deal(self):
+		try:
+			self.entry = self.progress.draw()
+		except IndexError:
+			self.entry = None
+			self.state = 'finished'
+			return self.state
+		self.mistakes = 0
+		self.showing_letter = False
+		self.showing_example = False
+		self.state = 'guessing'
+		return self.state
+
+	def next(self):
+		"""Leave a solved or failed card and deal the next one"""
+		self.expect('solved', 'failed', 'complete')
+		self.rounds += 1
+		if self.state == 'complete':
+			self.progress.complete_session()
+		return self.deal()
+
+	def quality(self):
+		"""How well the word was known, from 3 to 5, for the scheduler: the
+		fewer wrong guesses and hints, the later the word comes back"""
+		quality = 5 if self.mistakes == 0 else 4 if self.mistakes <= 2 else 3
+		if self.showing_letter or self.showing_example:
+			quality -= 1
+		return max(quality, 3)
+
+	def submit_guess(self, answer):
+		"""Check an answer against the word on the card. Returns the new state"""
+		self.expect('guessing')
+		if answer.lower() == self.entry.word.lower():
+			self.progress.mark_known(self.entry, self.quality())
+			self.state = 'complete' if self.progress.current.is_complete() else 'solved'
+		else:
+			self.mistakes += 1
+			if self.mistakes >= self.max_attempts:
+				self.progress.mark_unknown(self.entry)
+				self.state = 'failed'
+		return self.state
+
+	def reveal_letter(self):
+		"""Show the first letter of the word"""
+		self.expect('guessing')
+		if not self.showing_letter:
+			self.showing_letter = True
+			self.progress.hint(self.entry)
+		return self.entry.word[0]
+
+	def show_example(self):
+		self.expect('guessing')
+		if not self.showing_example:
+			self.showing_example = True
+			self.progress.hint(self.entry)
+
+	def skip(self):
+		"""Put the card back in the round queue and deal the next one"""
+		self.expect('guessing')
+		self.progress.skip(self.entry)
+		return self.deal()
+
+	def give_up(self):
+		"""Same as running out of attempts"""
+		self.expect('guessing')
+		self.progress.reveal(self.entry)
+		self.state = 'failed'
+		return self.state
+
+
+def play(engine, rounds, p_known=0.7, rng=random, tick=None):
+	"""Scripted learner: knows each word with probability p_known, otherwise
+	makes wrong guesses until the card is lost. tick() is called after each 
+	round, e.g. to move a simulated clock forward"""
+	for _ in range(rounds):
+		if engine.state == 'finished':
+			break
+		if rng.random() < p_known:
+			engine.submit_guess(engine.entry.word)
+		else:
+			while engine.state == 'guessing':
+				engine.submit_guess('')
+		engine.next()
+		if tick is not None:
+			tick()
+	return engine
+
+if __name__ == "__main__":
+	# Play rounds with a scripted learner on a fresh copy of the deck, 
+	# 100 rounds a day: python engine.py [rounds]
+	from deckfile import load_deck_or_vocabulary
+	from pathlib import Path
+	from scheduler import day
+	vocabulary = load_deck_or_vocabulary(Path(__file__).resolve().parent.parent / 'game_data')
+	progress = GameProgress(MasterSession(range(len(vocabulary))), vocabulary=vocabulary)
+	now = [time.time()]
+	progress.clock = lambda: now[0]
+	def tick():
+		now[0] += day/100
+	rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+	start = time.perf_counter()
+	engine = play(GameEngine(progress), rounds, tick=tick)
+	elapsed = time.perf_counter() - start
+	print('{} rounds in {:.2f} s ({:.0f} rounds/s), {} sessions played'.format(
+		engine.rounds, elapsed, engine.rounds/elapsed, len(progress.old_sessions)))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+import random
+
+class WeightedSampler():
+	"""Growable list of non-negative weights kept in a Fenwick tree, so that 
+	changing a weight, getting the total or drawing an index in proportion to
+	its weight all cost O(log n). Appending and popping the last weight are 
+	O(log n) and O(1).
+	Float weights leave rounding errors in the tree, so whether any weight is
+	positive is told by a count of them rather than by the total"""
+	__slots__ = ('weights', 'tree', 'positive')
+
+	def __init__(self, weights=()):
+		self.weights = list(weights)
+		self.positive = sum(1 for weight in self.weights if weight > 0)
+		# tree[i] holds the sum of weights (i - lowbit(i), i], 1-indexed
+		self.tree = [0] + self.weights
+		for i in range(1, len(self.tree)):
+			parent = i + (i & -i)
+			if parent < len(self.tree):
+				self.tree[parent] += self.tree[i]
+
+	def __repr__(self):
+		return 'WeightedSampler({})'.format(self.weights)
+
+	def __len__(self):
+		return len(self.weights)
+
+	def __iter__(self):
+		return iter(self.weights)
+
+	def __getitem__(self, index):
+		return self.weights[index]
+
+	def __setitem__(self, index, weight):
+		if weight < 0:
+			raise ValueError('Weights cannot be negative')
+		if index < 0:
+			index += len(self.weights)
+		delta = weight - self.weights[index]
+		self.positive += (weight > 0) - (self.weights[index] > 0)
+		self.weights[index] = weight
+		if self.positive == 0:
+			# All weights are 0: drop what rounding left in the tree
+			self.tree = [0] * len(self.tree)
+			return
+		i = index + 1
+		while i < len(self.tree):
+			self.tree[i] += delta
+			i += i & -i
+
+	def prefix(self, n):
+		"""Sum of the first n weights"""
+		total = 0
+		while n > 0:
+			total += self.tree[n]
+			n -= n & -n
+		return total
+
+	@property
+	def total(self):
+		if self.positive == 0:
+			return 0
+		return self.prefix(len(self.weights))
+
+	def append(self, weight):
+		if weight < 0:
+			raise ValueError('Weights cannot be negative')
+		self.weights.append(weight)
+		self.positive += weight > 0
+		i = len(self.weights)
+		self.tree.append(weight + self.prefix(i - 1) - self.prefix(i - (i & -i)))
+
+	def pop(self):
+		"""Remove the last weight and return it"""
+		self.tree.pop()
+		weight = self.weights.pop()
+		self.positive -= weight > 0
+		if self.positive == 0:
+			self.tree = [0] * len(self.tree)
+		return weight
+
+	def copy(self):
+		copy = WeightedSampler.__new__(WeightedSampler)
+		copy.weights = self.weights.copy()
+		copy.tree = self.tree.copy()
+		copy.positive = self.positive
+		return copy
+
+	def sample(self, rng=random):
+		"""Index drawn with probability weight/total. Raises IndexError if all
+		weights are 0"""
+		total = self.total
+		if self.positive == 0 or total <= 0:
+			raise IndexError('Cannot sample from zero total weight')
+		target = rng.random() * total
+		position = 0
+		step = 1 << (len(self.weights).bit_length() - 1)
+		while step:
+			if position + step <= len(self.weights) and self.tree[position + step] <= target:
+				position += step
+				target -= self.tree[position]
+			step >>= 1
+		# Rounding can push the target past the last positive weight
+		position = min(position, len(self.weights) - 1)
+		while position >= 0 and self.weights[position] == 0:
+			position -= 1
+		if position < 0:
+			# ... or onto zero weights before the first positive one
+			position = next(i for i, weight in enumerate(self.weights) if weight > 0)
+		return position
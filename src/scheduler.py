@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+import heapq
+import time
+
+day = 24*60*60
+
+class CardState():
+	"""SM-2 review state of one entry"""
+	__slots__ = ('ease', 'interval', 'due', 'reps', 'lapses', 'held', 'version')
+
+	def __init__(self, ease=2.5, interval=0, due=0, reps=0, lapses=0, held=False):
+		self.ease = ease
+		self.interval = interval # Days
+		self.due = due           # Epoch seconds
+		self.reps = reps
+		self.lapses = lapses
+		self.held = held         # In a session, so not in the due queue
+		self.version = 0
+
+	def __repr__(self):
+		return ('CardState(ease={:.2f}, interval={}, due={:.0f}, reps={}, lapses={})'
+			.format(self.ease, self.interval, self.due, self.reps, self.lapses))
+
+	def __reduce__(self):
+		return (CardState, (self.ease, self.interval, self.due, self.reps, 
+							self.lapses, self.held))
+
+class Scheduler():
+	"""SM-2 style spaced repetition over the words already played.
+	Each reviewed entry has an ease, an interval and a due time, and sits in a
+	heap keyed by due time, so the most overdue words are found in O(log n) 
+	whatever the size of the deck and history. Words pulled into a session 
+	are held out of the heap until they are reviewed again.
+
+	Quality of an answer goes from 0 (no idea) to 5 (perfect). Answers below
+	3 are lapses and bring the word back the next day. Correct answers only 
+	lengthen the interval when the word was due, so seeing a word several 
+	times in one session doesn't push it months away"""
+	def __init__(self, states=None):
+		self.states = {} if states is None else states
+		self.heap = [(state.due, entry_id, state.version) 
+					for entry_id, state in self.states.items() if not state.held]
+		heapq.heapify(self.heap)
+
+	def __repr__(self):
+		return 'Scheduler with {} reviewed words, {} due'.format(
+			len(self.states), len(self.due_ids(time.time())))
+
+	def __len__(self):
+		return len(self.states)
+
+	def __reduce__(self):
+		return (Scheduler, (self.states,))
+
+	def copy(self):
+		return Scheduler({entry_id: CardState(s.ease, s.interval, s.due, s.reps, 
+											s.lapses, s.held)
+						for entry_id, s in self.states.items()})
+
+	def push(self, entry_id):
+		state = self.states[entry_id]
+		state.version += 1
+		state.held = False
+		heapq.heappush(self.heap, (state.due, entry_id, state.version))
+
+	def review(self, entry_id, quality, now=None):
+		"""Update the state of an entry after an answer of the given quality"""
+		now = time.time() if now is None else now
+		state = self.states.get(entry_id)
+		if state is None:
+			state = self.states[entry_id] = CardState()
+		if quality >= 3:
+			if state.reps > 0 and now < state.due:
+				# Early review: nothing learnt about the interval
+				self.push(entry_id)
+				return state
+			if state.reps == 0:
+				state.interval = 1
+			elif state.reps == 1:
+				state.interval = 6
+			else:
+				state.interval = round(state.interval * state.ease)
+			state.reps += 1
+		else:
+			state.reps = 0
+			state.interval = 1
+			state.lapses += 1
+		state.ease = max(1.3, state.ease + 0.1 - (5-quality)*(0.08 + (5-quality)*0.02))
+		state.due = now + state.interval*day
+		self.push(entry_id)
+		return state
+
+	def hold(self, entry_id):
+		"""Take an entry out of the due queue while it is in a session"""
+		state = self.states.get(entry_id)
+		if state is not None:
+			state.version += 1
+			state.held = True
+
+	def clean(self):
+		# Drop heap items of entries that were held or reviewed again since
+		while self.heap:
+			_, entry_id, version = self.heap[0]
+			if self.states[entry_id].version == version:
+				return
+			heapq.heappop(self.heap)
+
+	def next_card(self, now=None):
+		"""Id of the most overdue entry, or None if nothing is due"""
+		now = time.time() if now is None else now
+		self.clean()
+		if self.heap and self.heap[0][0] <= now:
+			return self.heap[0][1]
+		return None
+
+	def pop_due(self, n, now=None):
+		"""Hold and return the ids of up to n due entries, most overdue first"""
+		now = time.time() if now is None else now
+		due = []
+		while len(due) < n:
+			entry_id = self.next_card(now)
+			if entry_id is None:
+				break
+			heapq.heappop(self.heap)
+			self.hold(entry_id)
+			due.append(entry_id)
+		return due
+
+	def due_ids(self, now):
+		"""Ids of all entries due at now, in no particular order"""
+		return [entry_id for due, entry_id, version in self.heap 
+				if due <= now and self.states[entry_id].version == version]
+
+	def weight(self, entry_id):
+		"""Sampling weight of an entry in a session: words that lapsed more 
+		often come up more often"""
+		state = self.states.get(entry_id)
+		return 1 if state is None else 1 + state.lapses
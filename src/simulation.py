@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""Simulate thousands of learners at once to compare ways of choosing cards.
+Each learner is a row of NumPy arrays (recall probability, status and whether
+each word was played), and every card drawn is one array operation for all
+learners, so a million reviews take seconds instead of a Python loop per card.
+
+The model is deliberately simple: a learner answers a card right with its
+recall probability for the word, gets a bit better at the word every time the
+card is shown, and forgets a bit of every word between sessions"""
+import sys
+import time
+import numpy as np
+from wordentry import *
+
+# Recall probability of a word before it was ever played
+recall = {'Common': 0.5, 'Basic': 0.35, 'Advanced': 0.2}
+
+# Card policies, as the weights of the stacks sample1 chooses from (see
+# Session.status_weights). review_share is the part of each session given to
+# the weakest words already played, the rest being new words drawn as
+# sampleN_pop does
+policies = {
+	'game':          {'weights': Session.status_weights, 'review_share': 0},
+	'uniform':       {'weights': {'known': 1, 'unknown': 1, 'unseen': 1}, 'review_share': 0},
+	'unknown_first': {'weights': {'known': 0.5, 'unknown': 4, 'unseen': 2}, 'review_share': 0},
+	'reviews':       {'weights': Session.status_weights, 'review_share': 0.4},
+}
+
+known, unknown, unseen = range(3) # Same order as Session.statuses
+
+class SimulationReport():
+	"""What came out of simulate()"""
+	def __init__(self, policy, learners, sessions, reviews, elapsed, cards_per_session,
+				completion, cards_per_minute, sessions_to_mastery, reached_mastery, mastered):
+		self.policy = policy
+		self.learners = learners
+		self.sessions = sessions
+		self.reviews = reviews
+		self.elapsed = elapsed
+		self.cards_per_session = cards_per_session # Cards to complete a session
+		self.completion = completion               # Share of sessions completed
+		self.cards_per_minute = cards_per_minute   # Of learner time
+		self.sessions_to_mastery = sessions_to_mastery # Mean over those who got there, or None
+		self.reached_mastery = reached_mastery     # Share of learners who got there
+		self.mastered = mastered                   # Share of the words played mastered at the end
+
+	def __repr__(self):
+		stm = 'n/a' if self.sessions_to_mastery is None else \
+			'{:.1f}'.format(self.sessions_to_mastery)
+		return ('{p}: {c:.1f} cards/session, {cpm:.1f} cards/min, {stm} sessions '
+			'to mastery ({r:.0%} of learners), {m:.0%} of words mastered; '
+			'{n} reviews in {e:.2f} s'
+			.format(p=self.policy, c=self.cards_per_session, cpm=self.cards_per_minute,
+					stm=stm, r=self.reached_mastery,
+					m=self.mastered, n=self.reviews, e=self.elapsed))
+
+def deck_difficulties(vocabulary):
+	"""Difficulty of every entry of a vocabulary, by id"""
+	return [entry.difficulty for entry in vocabulary]
+
+def ranks(keys):
+	"""Rank of each key within its row"""
+	rank = np.empty(keys.shape, dtype=np.int64)
+	np.put_along_axis(rank, np.argsort(keys, axis=1), 
+		np.broadcast_to(np.arange(keys.shape[1]), keys.shape), axis=1)
+	return rank
+
+def choose_sessions(rng, p, played, session_size, review_share):
+	"""Ids of the words of the next session of every learner, shape
+	(learners, session_size): the weakest played words for review_share of the
+	session, the rest new words at random. When either kind runs out the other
+	one makes up for it"""
+	n_learners, n_words = p.shape
+	n_played = played.sum(axis=1)
+	n_reviews = np.minimum(int(review_share*session_size), n_played)
+	n_reviews = np.maximum(n_reviews, session_size - (n_words - n_played))
+	review_rank = ranks(np.where(played, p, np.inf))
+	new_rank = ranks(np.where(played, np.inf, rng.random(p.shape)))
+	chosen = (played & (review_rank < n_reviews[:, None])) | \
+		(~played & (new_rank < (session_size - n_reviews)[:, None]))
+	return np.nonzero(chosen)[1].reshape(n_learners, session_size)
+
+def play_session(rng, p, weights, learn_rate, max_cards, seconds):
+	"""Play one session for every learner until all its words are known or
+	max_cards were drawn. p is the recall probability of the words of the
+	session, updated in place. Returns cards drawn, seconds spent and whether
+	the session was completed, per learner.
+	Each step only works on the learners still playing, and stack sizes are
+	kept up to date instead of being counted again"""
+	n_learners, n_words = p.shape
+	status = np.full(p.shape, unseen, dtype=np.int8)
+	counts = np.zeros((n_learners, 3), dtype=np.int64)
+	counts[:, unseen] = n_words
+	cards = np.zeros(n_learners, dtype=np.int64)
+	spent = np.zeros(n_learners)
+	active = np.arange(n_learners)
+	for _ in range(max_cards):
+		if len(active) == 0:
+			break
+		# Stack to draw from, in proportion to its weight if it has words
+		w = np.where(counts[active] > 0, weights, 0)
+		target = rng.random(len(active)) * w.sum(axis=1)
+		stack = np.minimum((target[:, None] >= np.cumsum(w, axis=1)).sum(axis=1), 2)
+		# Any word of that stack: the n-th one, n at random
+		in_stack = status[active] == stack[:, None]
+		n = (rng.random(len(active)) * counts[active, stack]).astype(np.int64)
+		word = (np.cumsum(in_stack, axis=1) <= n[:, None]).sum(axis=1)
+		recall_p = p[active, word]
+		correct = rng.random(len(active)) < recall_p
+		new_status = np.where(correct, known, unknown)
+		counts[active, stack] -= 1 # One card per learner: no repeated index
+		counts[active, new_status] += 1
+		status[active, word] = new_status
+		p[active, word] += learn_rate * (1 - recall_p)
+		cards[active] += 1
+		spent[active] += np.where(correct, seconds[0], seconds[1])
+		active = active[counts[active, known] < n_words]
+	done = counts[:, known] == n_words
+	return cards, spent, done
+
+def simulate(deck, policy='game', learners=1000, sessions=20, session_size=50,
+			learn_rate=0.3, retention=0.98, mastery=0.8, target=0.5, max_cards=400,
+			seconds=(8, 30), seed=None):
+	"""Play sessions sessions for each of learners synthetic learners over a
+	deck (a list of difficulties, one per word, see deck_difficulties), with
+	one of the policies (by name or as a dict like those of policies).
+	- learn_rate: share of what is left to learn of a word learnt by seeing it
+	- retention: share of recall probability kept from a session to the next
+	- mastery: recall probability from which a word counts as mastered
+	- target: share of the words of the first session to master. The set is
+	  fixed so that new words don't move the goal further every session
+	- seconds: time spent on a card answered right and on a missed one
+	Returns a SimulationReport"""
+	name = policy if isinstance(policy, str) else 'custom'
+	policy = policies[policy] if isinstance(policy, str) else policy
+	weights = np.array([policy['weights'][s] for s in Session.statuses], dtype=float)
+	rng = np.random.default_rng(seed)
+	start = time.perf_counter()
+
+	base = np.array([recall.get(difficulty, 0.3) for difficulty in deck])
+	p = np.clip(base + rng.normal(0, 0.1, (learners, len(deck))), 0.01, 0.99)
+	played = np.zeros(p.shape, dtype=bool)
+	rows = np.arange(learners)[:, None]
+	session_size = min(session_size, len(deck))
+	to_mastery = np.full(learners, np.nan)
+	cards, spent, completed = 0, 0.0, 0
+	for session in range(sessions):
+		words = choose_sessions(rng, p, played, session_size, policy['review_share'])
+		session_p = p[rows, words]
+		n_cards, n_spent, done = play_session(rng, session_p, weights, learn_rate,
+											max_cards, seconds)
+		p[rows, words] = session_p
+		played[rows, words] = True
+		cards += n_cards.sum()
+		spent += n_spent.sum()
+		completed += done.sum()
+		p[played] *= retention
+		if session == 0:
+			first = words
+		reached = (p[rows, first] >= mastery).sum(axis=1) >= target*first.shape[1]
+		to_mastery[reached & np.isnan(to_mastery)] = session + 1
+
+	elapsed = time.perf_counter() - start
+	reached = ~np.isnan(to_mastery)
+	return SimulationReport(name, learners, sessions, int(cards), elapsed,
+		cards_per_session=cards / (learners*sessions),
+		completion=completed / (learners*sessions),
+		cards_per_minute=60*cards/spent if spent else 0.0,
+		sessions_to_mastery=float(to_mastery[reached].mean()) if reached.any() else None,
+		reached_mastery=reached.mean(),
+		mastered=((p >= mastery) & played).sum() / played.sum())
+
+if __name__ == "__main__":
+	# Compare the policies on the game's deck: python simulation.py [learners]
+	from deckfile import load_deck_or_vocabulary
+	from pathlib import Path
+	vocabulary = load_deck_or_vocabulary(Path(__file__).resolve().parent.parent / 'game_data')
+	deck = deck_difficulties(vocabulary)
+	learners = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+	for name in policies:
+		print(simulate(deck, name, learners=learners, seed=0))
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+from collections import namedtuple
+import heapq
+
+WordStat = namedtuple('WordStat', 'shown correct missed revealed hints last_seen')
+
+class WordStats():
+	"""Running counters of every word played, by entry id: times shown,
+	guessed right, missed, revealed, hints used and last time seen.
+	They are updated as each answer is given, so reading the stats of a word
+	costs O(1) however many sessions were played"""
+	counted = {'known': 1, 'unknown': 2, 'reveal': 3, 'hint': 4}
+
+	def __init__(self, counters=None):
+		self.counters = {} if counters is None else counters
+
+	def __repr__(self):
+		return 'WordStats of {} words'.format(len(self.counters))
+
+	def __len__(self):
+		return len(self.counters)
+
+	def __reduce__(self):
+		return (WordStats, (self.counters,))
+
+	def __getitem__(self, entry_id):
+		counter = self.counters.get(entry_id)
+		return WordStat(0, 0, 0, 0, 0, None) if counter is None else WordStat(*counter)
+
+	def copy(self):
+		return WordStats({entry_id: counter.copy()
+						for entry_id, counter in self.counters.items()})
+
+	def update(self, op, entry_id, now):
+		"""Count a journal operation on an entry: an answer, a skip or a hint"""
+		counter = self.counters.get(entry_id)
+		if counter is None:
+			counter = self.counters[entry_id] = [0, 0, 0, 0, 0, None]
+		if op != 'hint':
+			# Every card shown ends in an answer, a reveal or a skip
+			counter[0] += 1
+			counter[5] = now
+		if op in self.counted:
+			counter[self.counted[op]] += 1
+
+	def most_missed(self, n=10):
+		"""Ids of the n words missed or revealed most often"""
+		return heapq.nlargest(n, self.counters,
+			key=lambda entry_id: self.counters[entry_id][2] + self.counters[entry_id][3])
@@ -0,0 +1,875 @@
+#!/usr/bin/env python
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from wordentry import *
+from scheduler import Scheduler, CardState
+from stats import WordStats
+
+def write_atomic(path, data):
+	"""Write data to a temporary file, fsync it and rename it over path, so 
+	that path holds either the old or the new data even after a crash"""
+	path = Path(path)
+	temporary = path.with_name(path.name + '.tmp')
+	with open(temporary, 'wb') as f:
+		f.write(data)
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(temporary, path)
+
+class BackgroundSaver():
+	"""Write-behind saver. Objects are pickled and written atomically on a 
+	worker thread, so the game loop never waits for the disk. Saving to a path
+	that is still waiting to be written replaces the pending object, so only 
+	the newest state gets written. Callers must hand over objects nobody 
+	changes anymore, e.g. snapshots.
+	Data can also be appended to a file, in the order it was queued. Data that
+	failed to be appended is cut off the file again and goes first in the next
+	append to the same file.
+	SQL statements can be queued for a database connection too, and are run 
+	in order and committed together.
+	Errors of the worker are kept until taken with take_error() or flush()"""
+	def __init__(self, vocabulary):
+		self.vocabulary = vocabulary
+		self.pending = {}
+		self.unwritten = {}
+		self.writing = None
+		self.error = None
+		self.condition = threading.Condition()
+		self.thread = threading.Thread(target=self.run, name='BackgroundSaver', daemon=True)
+		self.thread.start()
+
+	def save(self, obj, path, then=None):
+		"""Queue obj to be written to path, then call then() once it is on disk"""
+		with self.condition:
+			self.pending[path] = ('save', obj, then)
+			self.condition.notify_all()
+
+	def append(self, data, path):
+		"""Queue bytes to be appended to path and fsynced"""
+		with self.condition:
+			if path in self.pending:
+				data = self.pending[path][1] + data
+			data = self.unwritten.pop(path, b'') + data
+			self.pending[path] = ('append', data, None)
+			self.condition.notify_all()
+
+	def execute(self, statements, db):
+		"""Queue statements, as (sql, rows) pairs run with executemany, to be
+		committed in one transaction on the connection db. It is only used by
+		the worker from now on"""
+		with self.condition:
+			if db in self.pending:
+				statements = self.pending[db][1] + statements
+			statements = self.unwritten.pop(db, []) + statements
+			self.pending[db] = ('sql', statements, None)
+			self.condition.notify_all()
+
+	def busy(self, path):
+		with self.condition:
+			return path in self.pending or self.writing == path
+
+	def run(self):
+		while True:
+			with self.condition:
+				while not self.pending:
+					self.condition.wait()
+				path = next(iter(self.pending))
+				kind, obj, then = self.pending.pop(path)
+				self.writing = path
+			try:
+				if kind == 'append':
+					self.write_append(path, obj)
+				elif kind == 'sql':
+					with path:
+						for sql, rows in obj:
+							path.executemany(sql, rows)
+				else:
+					write_atomic(path, dumps_session(obj, self.vocabulary))
+				if then is not None:
+					then()
+			except Exception as error:
+				with self.condition:
+					self.error = error
+					if kind in ('append', 'sql'):
+						# Rolled back or cut off: goes first in the next one
+						self.unwritten[path] = obj + self.unwritten.get(path, obj[:0])
+			with self.condition:
+				self.writing = None
+				self.condition.notify_all()
+
+	def write_append(self, path, data):
+		with open(path, 'ab') as f:
+			start = f.tell()
+			try:
+				f.write(data)
+				f.flush()
+				os.fsync(f.fileno())
+			except Exception:
+				# Don't leave part of the data behind: it is written again later
+				try:
+					f.truncate(start)
+				except OSError:
+					pass
+				raise
+
+	def take_error(self):
+		"""Last error the worker ran into, if any. It is cleared once taken"""
+		with self.condition:
+			error, self.error = self.error, None
+		return error
+
+	def flush(self):
+		"""Wait until every queued object is written. Raises the last error the
+		worker ran into, if any"""
+		with self.condition:
+			while self.pending or self.writing is not None:
+				self.condition.wait()
+		error = self.take_error()
+		if error is not None:
+			raise error
+
+class PickleStorage():
+	"""Keep the game progress as one pickle (game_progress.obj) holding the 
+	master, current and old sessions, the scheduler and the stats, rewritten
+	in full on every save. One atomic write, so they never disagree on which
+	words were drawn even after a crash.
+	Older saves kept them in five files (master_session.obj, 
+	current_session.obj, old_sessions.obj, scheduler.obj and stats.obj), 
+	still read when there is no game_progress.obj; the game data ships the
+	first one.
+	Saves are written in the background by a BackgroundSaver. A save that 
+	fails is reported on stderr and the game goes on: the next save writes 
+	everything again"""
+	def __init__(self, directory, vocabulary):
+		self.directory = Path(directory)
+		self.vocabulary = vocabulary
+		self.saver = BackgroundSaver(vocabulary)
+		self.progress_path = self.path('game_progress.obj')
+
+	def path(self, filename):
+		return self.directory / filename
+
+	def load(self):
+		"""Load the progress, starting a fresh history if there is none. 
+		Raises VocabularyMismatch if it was saved against another vocabulary"""
+		progress = self.read()
+		progress.journal = self.record
+		progress.resume()
+		if self.legacy_master:
+			# Save the master as ids right away, so the next start reads ids only
+			self.save(progress)
+		return progress
+
+	def read(self):
+		"""GameProgress as saved in the pickle files"""
+		if self.progress_path.exists():
+			return self.read_snapshot(self.progress_path)
+		master = load_session(self.path('master_session.obj'), self.vocabulary)
+		# Older saves kept the unused words as a Session of entries, all 
+		# decoded on load (see MasterSession)
+		self.legacy_master = not isinstance(master, MasterSession)
+		try:
+			current = load_session(self.path('current_session.obj'), self.vocabulary)
+		except VocabularyMismatch:
+			raise
+		except Exception:
+			current = None
+		try:
+			old_sessions = load_session(self.path('old_sessions.obj'), self.vocabulary)
+		except VocabularyMismatch:
+			raise
+		except Exception:
+			old_sessions = []
+		try:
+			scheduler = load_session(self.path('scheduler.obj'), self.vocabulary)
+		except VocabularyMismatch:
+			raise
+		except Exception:
+			scheduler = None
+		try:
+			stats = load_session(self.path('stats.obj'), self.vocabulary)
+		except VocabularyMismatch:
+			raise
+		except Exception:
+			stats = None
+		return GameProgress(master, current, old_sessions, scheduler, 
+							self.vocabulary, stats)
+
+	def read_snapshot(self, path):
+		"""GameProgress saved as one snapshot (see snapshot). Sets seq"""
+		snapshot = load_session(path, self.vocabulary)
+		self.seq = snapshot.get('seq', 0)
+		self.legacy_master = not isinstance(snapshot['master'], MasterSession)
+		return GameProgress(snapshot['master'], snapshot['current'], 
+			snapshot['old_sessions'], snapshot.get('scheduler'), self.vocabulary,
+			snapshot.get('stats'))
+
+	def snapshot(self, progress, seq=0):
+		"""Copy of the whole progress as one dict to be saved in the 
+		background. seq is the last journal record it includes"""
+		progress = progress.snapshot()
+		return {'seq': seq, 'master': progress.master, 'current': progress.current,
+				'old_sessions': progress.old_sessions, 'scheduler': progress.scheduler,
+				'stats': progress.stats}
+
+	def record(self, op, *args):
+		"""Called on every change of the progress. Nothing to do here: changes
+		are only written on save()"""
+		pass
+
+	def checkpoint(self, force=False):
+		"""Called every frame during play. The whole progress is only saved 
+		on save()"""
+		pass
+
+	def report(self, error):
+		print('Could not save the progress: {}'.format(error), file=sys.stderr)
+
+	def flush(self):
+		"""Wait for pending saves to be written. Returns False if one failed"""
+		try:
+			self.saver.flush()
+		except Exception as error:
+			self.report(error)
+			return False
+		return True
+
+	def save(self, progress):
+		error = self.saver.take_error()
+		if error is not None:
+			self.report(error)
+		self.saver.save(self.snapshot(progress), self.progress_path)
+
+	def close(self):
+		"""Wait for pending saves to be written"""
+		self.flush()
+
+class JournalStorage(PickleStorage):
+	"""Keep the game progress as a snapshot (progress.obj) plus an append-only 
+	journal (progress.journal) with one small JSON line per change: a draw, a
+	guess, a skip, a reveal or a session rollover. save() only rewrites the 
+	snapshot once the journal has grown past compact_every records.
+
+	Changes are appended to the journal in checkpoints, written in the 
+	background whenever checkpoint() finds checkpoint_every changes waiting or
+	the oldest one waiting for checkpoint_delay seconds. Each checkpoint ends 
+	with a line holding the checksum of its records, and loading stops at the
+	last checkpoint that was completely written.
+
+	Loading replays the journal on top of the snapshot. Journal lines are 
+	numbered and the snapshot remembers the last one it includes, so a crash 
+	while compacting never applies a change twice. Without a snapshot, the 
+	progress is read from the files of PickleStorage.
+
+	Snapshots are written in the background. Meanwhile the journal they 
+	include is kept as progress.journal.old, and deleted once the snapshot is
+	on disk. Until then the journal is not set aside again, so a snapshot 
+	that failed never takes records with it.
+
+	Journal records hold entry ids, so each journal file starts with the 
+	fingerprint of the vocabulary, checked on load like the one of the 
+	snapshot"""
+	def __init__(self, directory, vocabulary, compact_every=500, 
+				checkpoint_every=10, checkpoint_delay=5):
+		super().__init__(directory, vocabulary)
+		self.compact_every = compact_every
+		self.checkpoint_every = checkpoint_every
+		self.checkpoint_delay = checkpoint_delay
+		self.snapshot_path = self.path('progress.obj')
+		self.journal_path = self.path('progress.journal')
+		self.old_journal_path = self.path('progress.journal.old')
+		self.buffer = []
+		self.buffered_since = None
+		self.seq = 0
+		self.pending = 0
+		self.journal_started = False
+
+	def load(self):
+		if self.snapshot_path.exists():
+			progress = self.read_snapshot(self.snapshot_path)
+		else:
+			progress = self.read()
+			# Nothing read from the pickles is in the journal
+			self.seq = 0
+		self.replay(progress)
+		self.journal_started = self.journal_path.exists()
+		progress.journal = self.record
+		progress.resume()
+		if not self.snapshot_path.exists():
+			# Progress read from the pickle files: write the snapshot right 
+			# away, so the next start reads it instead
+			self.compact(progress)
+		return progress
+
+	def replay(self, progress):
+		"""Apply the journal records newer than the snapshot. A checkpoint torn
+		by a crash in the middle of a write is cut off. A journal left over by
+		a snapshot that never made it to disk is merged back"""
+		self.pending = 0
+		if self.old_journal_path.exists():
+			records = self.replay_file(progress, self.old_journal_path)
+			if self.journal_path.exists():
+				records += self.replay_file(progress, self.journal_path)
+			write_atomic(self.journal_path, records)
+			os.remove(self.old_journal_path)
+		elif self.journal_path.exists():
+			records = self.replay_file(progress, self.journal_path)
+			with open(self.journal_path, 'r+b') as journal:
+				journal.truncate(len(records))
+
+	def replay_file(self, progress, path):
+		"""Replay the complete checkpoints of one journal file and return the 
+		part of the file they take"""
+		valid = bytearray()
+		checkpoint = bytearray()
+		records = []
+		with open(path, 'rb') as journal:
+			for line in journal:
+				if not line.endswith(b'\n'):
+					break
+				try:
+					record = json.loads(line)
+				except ValueError:
+					break
+				if record[0] == 'vocabulary':
+					check_fingerprint(record[1:], self.vocabulary, str(path))
+					valid += line
+					continue
+				if record[0] != 'checkpoint':
+					checkpoint += line
+					records.append(record)
+					continue
+				_, n_records, checksum = record
+				if n_records != len(records) or checksum != zlib.crc32(checkpoint):
+					break
+				for seq, op, *args in records:
+					self.pending += 1
+					if seq > self.seq:
+						progress.apply(self.vocabulary, op, *args)
+						self.seq = seq
+				valid += checkpoint + line
+				checkpoint = bytearray()
+				records = []
+		return bytes(valid)
+
+	def record(self, op, *args):
+		self.seq += 1
+		self.buffer.append(json.dumps([self.seq, op, *args]) + '\n')
+		if self.buffered_since is None:
+			self.buffered_since = time.monotonic()
+		self.pending += 1
+
+	def checkpoint(self, force=False):
+		"""Hand the changes waiting in memory to the background saver if there
+		are enough of them, if they have waited long enough, or if forced.
+		Cheap enough to be called every frame"""
+		if not self.buffer:
+			return
+		if force or len(self.buffer) >= self.checkpoint_every or \
+			time.monotonic() - self.buffered_since >= self.checkpoint_delay:
+			records = ''.join(self.buffer).encode('utf-8')
+			end = json.dumps(['checkpoint', len(self.buffer), zlib.crc32(records)])
+			data = records + end.encode('utf-8') + b'\n'
+			if not self.journal_started:
+				start = json.dumps(['vocabulary', *self.vocabulary.fingerprint()])
+				data = start.encode('utf-8') + b'\n' + data
+				self.journal_started = True
+			self.saver.append(data, self.journal_path)
+			self.buffer = []
+			self.buffered_since = None
+
+	def save(self, progress):
+		"""Write a checkpoint with the last changes, and fold the journal into 
+		the snapshot when it has grown long enough"""
+		error = self.saver.take_error()
+		if error is not None:
+			self.report(error)
+		self.checkpoint(force=True)
+		if self.pending >= self.compact_every:
+			self.compact(progress)
+
+	def compact(self, progress):
+		"""Write the whole progress as a new snapshot and start a new journal.
+		Nothing is set aside unless the journal was completely written and the
+		previous snapshot is on disk"""
+		self.checkpoint(force=True)
+		if not self.flush():
+			return
+		snapshot = self.snapshot(progress, self.seq)
+		if self.old_journal_path.exists():
+			# The previous snapshot failed. Only write it again: it includes 
+			# the journal too, whose records it makes redundant, and the old
+			# journal goes once it is on disk
+			self.saver.save(snapshot, self.snapshot_path, then=self.remove_old_journal)
+			return
+		if self.journal_path.exists():
+			os.replace(self.journal_path, self.old_journal_path)
+		self.journal_started = False
+		self.pending = 0
+		self.saver.save(snapshot, self.snapshot_path, then=self.remove_old_journal)
+
+	def remove_old_journal(self):
+		if self.old_journal_path.exists():
+			os.remove(self.old_journal_path)
+
+	def close(self):
+		self.checkpoint(force=True)
+		super().close()
+
+class SQLiteHistory():
+	"""List-like view of the archived sessions of a SQLiteStorage. Only their 
+	ids are read on load; summaries are read from the database as they are 
+	accessed, a whole slice in one go, and the last cache_size of them are 
+	kept in memory"""
+	cache_size = 200
+
+	def __init__(self, storage, session_ids):
+		self.storage = storage
+		self.session_ids = session_ids
+		self.cache = OrderedDict()
+
+	def __len__(self):
+		return len(self.session_ids)
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			session_ids = self.session_ids[index]
+			missing = [session_id for session_id in session_ids 
+						if session_id not in self.cache]
+			if missing:
+				self.remember(self.storage.read_summaries(missing))
+			return [self.recall(session_id) for session_id in session_ids]
+		session_id = self.session_ids[index]
+		if session_id not in self.cache:
+			self.remember(self.storage.read_summaries([session_id]))
+		return self.recall(session_id)
+
+	def __iter__(self):
+		for index in range(len(self.session_ids)):
+			yield self[index]
+
+	def remember(self, summaries):
+		self.cache.update(summaries)
+		while len(self.cache) > max(self.cache_size, len(summaries)):
+			self.cache.popitem(last=False)
+
+	def recall(self, session_id):
+		self.cache.move_to_end(session_id)
+		return self.cache[session_id]
+
+	def append(self, session):
+		# Only the session being played can be archived
+		self.session_ids.append(self.storage.current_id)
+		self.remember({self.storage.current_id: session})
+
+class SQLiteStorage():
+	"""Keep vocabulary, sessions and every guess in a SQLite database.
+	Changes are written as they happen, and questions such as "all unknown 
+	words" or "next 50 unused cards" are indexed queries.
+
+	Like the checkpoints of JournalStorage, changes are committed together 
+	whenever checkpoint() finds checkpoint_every of them waiting or the oldest
+	one waiting for checkpoint_delay seconds, along with the round queue of 
+	the session being played. Commits run on a BackgroundSaver, so the game 
+	loop never waits for the disk.
+
+	If the database is new, it is filled with the given vocabulary and with 
+	the progress found in the pickle files of PickleStorage in migrate_from, 
+	if any. Otherwise the given vocabulary, e.g. a mapped deck, must have the
+	fingerprint kept in the database, and is used as it is. Without one, the
+	vocabulary is read from the database"""
+	schema = '''
+	CREATE TABLE IF NOT EXISTS entries (
+		id INTEGER PRIMARY KEY, word TEXT NOT NULL, category TEXT NOT NULL,
+		meaning TEXT NOT NULL, example TEXT NOT NULL, difficulty TEXT NOT NULL,
+		used INTEGER NOT NULL DEFAULT 0);
+	CREATE INDEX IF NOT EXISTS entries_word ON entries (word);
+	CREATE INDEX IF NOT EXISTS entries_difficulty ON entries (difficulty, used);
+	CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+	CREATE TABLE IF NOT EXISTS sessions (
+		id INTEGER PRIMARY KEY, completed INTEGER NOT NULL DEFAULT 0,
+		archived INTEGER NOT NULL DEFAULT 0);
+	CREATE TABLE IF NOT EXISTS session_entries (
+		session_id INTEGER NOT NULL REFERENCES sessions (id),
+		entry_id INTEGER NOT NULL REFERENCES entries (id),
+		position INTEGER NOT NULL, status TEXT, weight REAL,
+		PRIMARY KEY (session_id, entry_id));
+	CREATE INDEX IF NOT EXISTS session_entries_status ON session_entries (status, entry_id);
+	CREATE TABLE IF NOT EXISTS queue (
+		session_id INTEGER NOT NULL REFERENCES sessions (id),
+		position INTEGER NOT NULL, entry_id INTEGER NOT NULL REFERENCES entries (id),
+		gap INTEGER NOT NULL, weight REAL NOT NULL,
+		PRIMARY KEY (session_id, position));
+	CREATE TABLE IF NOT EXISTS events (
+		id INTEGER PRIMARY KEY, session_id INTEGER REFERENCES sessions (id),
+		entry_id INTEGER REFERENCES entries (id), op TEXT NOT NULL, time REAL NOT NULL);
+	CREATE INDEX IF NOT EXISTS events_entry ON events (entry_id, op);
+	CREATE TABLE IF NOT EXISTS schedule (
+		entry_id INTEGER PRIMARY KEY REFERENCES entries (id),
+		ease REAL NOT NULL, interval INTEGER NOT NULL, due REAL NOT NULL,
+		reps INTEGER NOT NULL, lapses INTEGER NOT NULL, held INTEGER NOT NULL);
+	CREATE INDEX IF NOT EXISTS schedule_due ON schedule (due);
+	CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+	CREATE TABLE IF NOT EXISTS word_stats (
+		entry_id INTEGER PRIMARY KEY REFERENCES entries (id),
+		shown INTEGER NOT NULL, correct INTEGER NOT NULL, missed INTEGER NOT NULL,
+		revealed INTEGER NOT NULL, hints INTEGER NOT NULL, last_seen REAL);
+	'''
+
+	def __init__(self, path, vocabulary=None, migrate_from=None, 
+				checkpoint_every=10, checkpoint_delay=5):
+		self.path = Path(path)
+		self.db = sqlite3.connect(str(self.path))
+		self.db.execute('PRAGMA journal_mode = WAL')
+		self.db.executescript(self.schema)
+		if 'weight' not in [column for _, column, *_ in 
+							self.db.execute('PRAGMA table_info(session_entries)')]:
+			# Databases made before weights were saved
+			self.db.execute('ALTER TABLE session_entries ADD COLUMN weight REAL')
+		# Changes are written by the BackgroundSaver on a connection of their own
+		self.writer = sqlite3.connect(str(self.path), check_same_thread=False)
+		self.checkpoint_every = checkpoint_every
+		self.checkpoint_delay = checkpoint_delay
+		self.current_id = None
+		self.next_session_id = (self.db.execute(
+			'SELECT max(id) FROM sessions').fetchone()[0] or 0) + 1
+		self.progress = None
+		self.scheduler = None
+		self.stats = None
+		self.statements = []
+		self.uncommitted = 0
+		self.uncommitted_since = None
+		self.vocabulary = vocabulary
+		self.saver = BackgroundSaver(vocabulary)
+		if self.db.execute('SELECT count(*) FROM entries').fetchone()[0] == 0:
+			if vocabulary is None:
+				self.vocabulary = Vocabulary()
+				return
+			self.write_vocabulary(vocabulary)
+			if migrate_from is not None:
+				try:
+					legacy = PickleStorage(migrate_from, vocabulary).read()
+				except VocabularyMismatch:
+					raise
+				except Exception:
+					legacy = None
+				if legacy is not None:
+					self.write_progress(legacy)
+					self.commit()
+					self.flush()
+		elif vocabulary is None:
+			self.vocabulary = self.read_vocabulary()
+		else:
+			check_fingerprint(self.fingerprint(), vocabulary, str(self.path))
+
+	def read_vocabulary(self):
+		rows = self.db.execute(
+			'SELECT word, category, meaning, example, difficulty FROM entries ORDER BY id')
+		return Vocabulary(WordEntry(*row) for row in rows)
+
+	def write_vocabulary(self, vocabulary):
+		with self.db:
+			self.db.executemany(
+				'INSERT INTO entries (id, word, category, meaning, example, difficulty) '
+				'VALUES (?, ?, ?, ?, ?, ?)',
+				((e.id, e.word, e.category, e.meaning, e.example, e.difficulty) 
+				for e in vocabulary))
+			self.db.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)",
+				(json.dumps(vocabulary.fingerprint()),))
+
+	def fingerprint(self):
+		"""Fingerprint of the vocabulary in the database, without reading more 
+		than the keys of its entries"""
+		row = self.db.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+		if row is not None:
+			return tuple(json.loads(row[0]))
+		# Databases made before the fingerprint was kept
+		keys = self.db.execute('SELECT word, category FROM entries ORDER BY id').fetchall()
+		fingerprint = (len(keys), key_digest(keys))
+		with self.db:
+			self.db.execute("INSERT INTO meta VALUES ('fingerprint', ?)", 
+				(json.dumps(fingerprint),))
+		return fingerprint
+
+	def write(self, sql, rows):
+		"""Queue a statement, run once for each row by the next commit()"""
+		self.statements.append((sql, list(rows)))
+
+	def write_session(self, session, archived):
+		"""Insert a whole session, or the SessionSummary of an archived one, 
+		and return its id"""
+		if isinstance(session, SessionSummary):
+			known, unknown = set(session.known), set(session.unknown)
+			rows = [(entry_id, 'known' if entry_id in known else 
+					'unknown' if entry_id in unknown else None) 
+					for entry_id in session.stack]
+		else:
+			rows = [(entry.id, session.status(entry)) 
+					for entry in session.stack if entry.id is not None]
+		session_id = self.new_session_id()
+		self.write('INSERT INTO sessions (id, completed, archived) VALUES (?, ?, ?)',
+			[(session_id, int(session.completed), int(archived))])
+		self.write(
+			'INSERT OR IGNORE INTO session_entries (session_id, entry_id, position, status) '
+			'VALUES (?, ?, ?, ?)',
+			((session_id, entry_id, position, status) 
+			for position, (entry_id, status) in enumerate(rows)))
+		self.write('UPDATE entries SET used = 1 WHERE id = ?',
+			((entry_id,) for entry_id, _ in rows))
+		return session_id
+
+	def new_session_id(self):
+		# Ids are handed out here, so that nothing waits for the database
+		session_id = self.next_session_id
+		self.next_session_id += 1
+		return session_id
+
+	def write_progress(self, progress):
+		"""Copy a whole GameProgress into the (empty) database"""
+		unused = set(progress.master.active_stack)
+		self.write('UPDATE entries SET used = 1 WHERE id = ?',
+			((entry_id,) for entry_id in range(len(self.vocabulary)) 
+			if entry_id not in unused))
+		for session in progress.old_sessions:
+			self.write_session(session, archived=True)
+		if progress.current is not None:
+			self.write_queue(
+				self.write_session(progress.current, archived=False), progress.current)
+		for entry_id in progress.scheduler.states:
+			self.write_schedule(progress.scheduler, entry_id)
+		for entry_id in progress.stats.counters:
+			self.write_stats(progress.stats, entry_id)
+
+	def write_schedule(self, scheduler, entry_id):
+		s = scheduler.states[entry_id]
+		self.write(
+			'INSERT OR REPLACE INTO schedule '
+			'(entry_id, ease, interval, due, reps, lapses, held) '
+			'VALUES (?, ?, ?, ?, ?, ?, ?)', 
+			[(entry_id, s.ease, s.interval, s.due, s.reps, s.lapses, int(s.held))])
+
+	def write_stats(self, stats, entry_id):
+		self.write(
+			'INSERT OR REPLACE INTO word_stats '
+			'(entry_id, shown, correct, missed, revealed, hints, last_seen) '
+			'VALUES (?, ?, ?, ?, ?, ?, ?)', [(entry_id, *stats.counters[entry_id])])
+
+	def write_queue(self, session_id, session):
+		"""Replace the saved round queue of a session. Due draws are saved as
+		the number of draws left, so the count of draws needs no saving"""
+		self.write('DELETE FROM queue WHERE session_id = ?', [(session_id,)])
+		self.write(
+			'INSERT INTO queue (session_id, position, entry_id, gap, weight) '
+			'VALUES (?, ?, ?, ?, ?)',
+			((session_id, position, entry.id, due - session.draws, weight) 
+			for position, (due, entry, weight) in enumerate(session.queue)))
+
+	def read_session(self, session_id, scheduler=None):
+		"""Session as it was saved. Words saved without their weight are 
+		weighted by the scheduler, if given, as in GameProgress.weigh"""
+		rows = self.db.execute(
+			'SELECT entry_id, status, weight FROM session_entries WHERE session_id = ? '
+			'ORDER BY position', (session_id,)).fetchall()
+		session = Session([self.vocabulary[entry_id] for entry_id, _, _ in rows])
+		session.unseen = EntryStack()
+		for entry_id, status, weight in rows:
+			if status is not None:
+				if weight is None:
+					weight = 1 if scheduler is None else scheduler.weight(entry_id)
+				getattr(session, status).add(self.vocabulary[entry_id], weight)
+		session.completed = bool(self.db.execute(
+			'SELECT completed FROM sessions WHERE id = ?', (session_id,)).fetchone()[0])
+		for entry_id, gap, weight in self.db.execute(
+			'SELECT entry_id, gap, weight FROM queue WHERE session_id = ? '
+			'ORDER BY position', (session_id,)):
+			entry = self.vocabulary[entry_id]
+			status = session.status(entry)
+			if status is not None:
+				getattr(session, status).set_weight(entry, 0)
+			session.queue.append((gap, entry, weight))
+		# Words drawn but never answered have no status and aren't queued: the
+		# session being played queues them again (see Session.recover)
+		return session
+
+	def read_summaries(self, session_ids):
+		"""SessionSummary of each of the given sessions, by id"""
+		marks = ', '.join('?'*len(session_ids))
+		rows = {session_id: [] for session_id in session_ids}
+		for session_id, entry_id, status in self.db.execute(
+			'SELECT session_id, entry_id, status FROM session_entries '
+			'WHERE session_id IN ({}) ORDER BY session_id, position'.format(marks), 
+			session_ids):
+			rows[session_id].append((entry_id, status))
+		completed = dict(self.db.execute(
+			'SELECT id, completed FROM sessions WHERE id IN ({})'.format(marks), 
+			session_ids))
+		completed_at = dict(self.db.execute(
+			'SELECT session_id, max(time) FROM events WHERE session_id IN ({}) '
+			'GROUP BY session_id'.format(marks), session_ids))
+		return {session_id: SessionSummary(
+					(entry_id for entry_id, _ in rows[session_id]),
+					(entry_id for entry_id, status in rows[session_id] if status == 'known'),
+					(entry_id for entry_id, status in rows[session_id] if status == 'unknown'),
+					0, bool(completed[session_id]), completed_at.get(session_id))
+				for session_id in session_ids}
+
+	def load(self):
+		master = MasterSession(entry_id for entry_id, in 
+			self.db.execute('SELECT id FROM entries WHERE used = 0 ORDER BY id'))
+		archived = [session_id for session_id, in 
+			self.db.execute('SELECT id FROM sessions WHERE archived = 1 ORDER BY id')]
+		current = self.db.execute(
+			'SELECT max(id) FROM sessions WHERE archived = 0').fetchone()[0]
+		self.current_id = current
+		scheduler = Scheduler({entry_id: CardState(*row) for entry_id, *row in 
+			self.db.execute('SELECT entry_id, ease, interval, due, reps, lapses, held '
+							'FROM schedule')})
+		stats = WordStats({entry_id: list(row) for entry_id, *row in 
+			self.db.execute('SELECT entry_id, shown, correct, missed, revealed, hints, '
+							'last_seen FROM word_stats')})
+		progress = GameProgress(master, 
+			None if current is None else self.read_session(current, scheduler),
+			SQLiteHistory(self, archived), scheduler, self.vocabulary, stats)
+		progress.journal = self.record
+		self.progress = progress
+		self.scheduler = scheduler
+		self.stats = stats
+		progress.resume()
+		return progress
+
+	def record(self, op, *args):
+		"""Write a change of the progress and log it as an event. It is 
+		committed by the next checkpoint"""
+		self.uncommitted += 1
+		if self.uncommitted_since is None:
+			self.uncommitted_since = time.monotonic()
+		if op == 'new_session':
+			self.current_id = self.new_session_id()
+			self.write('INSERT INTO sessions (id) VALUES (?)', [(self.current_id,)])
+			# Same weights as GameProgress.weigh gave the session
+			self.write(
+				"INSERT INTO session_entries (session_id, entry_id, position, status, weight) "
+				"VALUES (?, ?, ?, 'unseen', ?)",
+				((self.current_id, entry_id, position, self.scheduler.weight(entry_id)) 
+				for position, entry_id in enumerate(args[0])))
+			self.write('UPDATE entries SET used = 1 WHERE id = ?',
+				((entry_id,) for entry_id in args[0]))
+			self.write('UPDATE schedule SET held = 1 WHERE entry_id = ?',
+				((entry_id,) for entry_id in args[0]))
+			return
+		elif op == 'complete':
+			self.write('UPDATE sessions SET completed = 1 WHERE id = ?',
+				[(self.current_id,)])
+			return
+		elif op == 'archive':
+			self.write('UPDATE sessions SET archived = 1 WHERE id = ?',
+				[(self.current_id,)])
+			self.write('DELETE FROM queue WHERE session_id = ?', [(self.current_id,)])
+			self.current_id = None
+			return
+		elif op in ('dequeue', 'redraw', 'defer', 'put_back'):
+			# The round queue is saved as a whole by checkpoint()
+			return
+		status = {'known': 'known', 'unknown': 'unknown', 'reveal': 'unknown'}
+		if op == 'draw':
+			self.write(
+				'UPDATE session_entries SET status = NULL '
+				'WHERE session_id = ? AND entry_id = ?',
+				[(self.current_id, args[0])])
+		elif op in status:
+			# Answered words get the weight of their lapses (see GameProgress.weigh)
+			self.write(
+				'UPDATE session_entries SET status = ?, weight = ? '
+				'WHERE session_id = ? AND entry_id = ?',
+				[(status[op], self.scheduler.weight(args[0]), self.current_id, args[0])])
+		# Schedule and stats were updated before the change was reported
+		if len(args) == 3:
+			self.write_schedule(self.scheduler, args[0])
+		if len(args) > 1:
+			self.write_stats(self.stats, args[0])
+		self.write(
+			'INSERT INTO events (session_id, entry_id, op, time) VALUES (?, ?, ?, ?)',
+			[(self.current_id, args[0], op, args[-1] if len(args) > 1 else time.time())])
+
+	def commit(self):
+		"""Hand the statements queued so far to the background saver"""
+		if self.statements:
+			self.saver.execute(self.statements, self.writer)
+			self.statements = []
+
+	def checkpoint(self, force=False):
+		"""Commit the changes recorded so far, with the round queue, if there 
+		are enough of them, if they have waited long enough, or if forced.
+		Commits run in the background: this is cheap enough to be called 
+		every frame"""
+		if not self.uncommitted:
+			return
+		if force or self.uncommitted >= self.checkpoint_every or \
+			time.monotonic() - self.uncommitted_since >= self.checkpoint_delay:
+			if self.current_id is not None and self.progress.current is not None:
+				self.write_queue(self.current_id, self.progress.current)
+			self.commit()
+			self.uncommitted = 0
+			self.uncommitted_since = None
+
+	def flush(self):
+		"""Wait for the commits handed to the background saver. Returns False
+		if one failed, after reporting it"""
+		try:
+			self.saver.flush()
+		except Exception as error:
+			print('Could not save the progress: {}'.format(error), file=sys.stderr)
+			return False
+		return True
+
+	def save(self, progress):
+		"""Commit the changes not committed yet"""
+		error = self.saver.take_error()
+		if error is not None:
+			print('Could not save the progress: {}'.format(error), file=sys.stderr)
+		self.checkpoint(force=True)
+
+	def close(self):
+		self.checkpoint(force=True)
+		self.flush()
+		self.writer.close()
+		self.db.close()
+
+	def unknown_words(self):
+		"""Entries that were left unknown in any session"""
+		self.checkpoint(force=True)
+		self.flush()
+		return [self.vocabulary[entry_id] for entry_id, in self.db.execute(
+			"SELECT DISTINCT entry_id FROM session_entries WHERE status = 'unknown'")]
+
+	def next_unused(self, n, difficulty=None):
+		"""Up to n entries that no session has used yet"""
+		self.checkpoint(force=True)
+		self.flush()
+		if difficulty is None:
+			rows = self.db.execute(
+				'SELECT id FROM entries WHERE used = 0 LIMIT ?', (n,))
+		else:
+			rows = self.db.execute(
+				'SELECT id FROM entries WHERE difficulty = ? AND used = 0 LIMIT ?', 
+				(difficulty, n))
+		return [self.vocabulary[entry_id] for entry_id, in rows]
+
+def open_storage(kind, directory, vocabulary):
+	"""Storage backend by name: 'pickle', 'journal' or 'sqlite'"""
+	if kind == 'pickle':
+		return PickleStorage(directory, vocabulary)
+	elif kind == 'journal':
+		return JournalStorage(directory, vocabulary)
+	elif kind == 'sqlite':
+		return SQLiteStorage(Path(directory) / 'valebulary.db', vocabulary,
+							migrate_from=directory)
+	else:
+		raise ValueError('Unknown storage {}'.format(kind))
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+from collections import OrderedDict
+
+class TextCache():
+	"""Surfaces of rendered strings, shared by everything that draws text.
+	Font.render is only called the first time a string is drawn with a font,
+	antialiasing and color, and the maxsize most recently drawn surfaces are
+	kept. hits and misses count how often a surface was found in the cache.
+	The surfaces are shared: they can be blitted, but not drawn on"""
+	def __init__(self, maxsize=1024):
+		self.maxsize = maxsize
+		self.surfaces = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def __repr__(self):
+		return 'TextCache({} surfaces, {} hits, {} misses)'.format(
+			len(self.surfaces), self.hits, self.misses)
+
+	def __len__(self):
+		return len(self.surfaces)
+
+	def render(self, font, text, antialias, color):
+		"""Same as font.render(text, antialias, color)"""
+		key = (font, text, antialias, tuple(color))
+		surface = self.surfaces.get(key)
+		if surface is not None:
+			self.hits += 1
+			self.surfaces.move_to_end(key)
+			return surface
+		self.misses += 1
+		surface = font.render(text, antialias, color)
+		self.surfaces[key] = surface
+		if len(self.surfaces) > self.maxsize:
+			self.surfaces.popitem(last=False)
+		return surface
+
+	def clear(self):
+		self.surfaces.clear()
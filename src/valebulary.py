@@ -1,29 +1,122 @@
 #!/usr/bin/env python
+import time
+start_time = time.perf_counter()
 import pygame
 import sys
-import time
+from functools import cached_property
 from pathlib import Path
 from pygame.locals import *
 import numpy as np
 from wordentry import *
+from storage import open_storage
+from deckfile import load_deck_or_vocabulary
+from engine import GameEngine
+from textcache import TextCache
 
 root = Path(__file__).parent.parent
-vocabulary = load_session(root / 'game_data' / 'vocabulary.obj')
-master_session = load_session(root / 'game_data' / 'master_session.obj')
+storage_backend = 'journal' # 'pickle', 'journal' or 'sqlite'
+startup_budget = 0.5 # Seconds from launch to the first frame of the start screen
+session_mix = None # New words per difficulty, e.g. {'Common': 30, 'Basic': 15, 'Advanced': 5}
 
-pygame.init()
 fps = 30
+idle_fps = 10 # Frame rate of menus and screens nobody has touched for a while
+idle_after = 2 # Seconds without any event before a screen slows down to idle_fps
 fpsClock = pygame.time.Clock()
 
+class FramePacer():
+	"""Frame rate of the screen loops. Frames come at fps while events come 
+	in, and slow down to idle_fps once none came for idle_after seconds, so 
+	that a screen left open barely takes any CPU. Animations keep ticking
+	fpsClock at fps.
+	pygame.event.wait can't replace this: it polls every millisecond until 
+	an event comes, which takes more CPU than a frame rate of fps"""
+	def __init__(self, clock, fps, idle_fps, idle_after):
+		self.clock = clock
+		self.fps = fps
+		self.idle_fps = idle_fps
+		self.idle_after = idle_after
+		self.last_event = time.monotonic()
+
+	def events(self):
+		"""Events that came since the last frame"""
+		events = pygame.event.get()
+		if events:
+			self.last_event = time.monotonic()
+		return events
+
+	def tick(self):
+		"""Wait for the next frame"""
+		if time.monotonic() - self.last_event < self.idle_after:
+			return self.clock.tick(self.fps)
+		return self.clock.tick(self.idle_fps)
+
+pacer = FramePacer(fpsClock, fps, idle_fps, idle_after)
+
+
+class AppContext():
+	"""Everything the game loads from disk: fonts, vocabulary and saved 
+	progress. Nothing is loaded until first used, so importing this module 
+	is cheap, and the start screen is drawn before the game data is read.
+	Load times are kept in timings.
+	All text is rendered through the TextCache in text"""
+	fonts = {
+		'title_font':           ('GoodUnicornRegular-Rxev.ttf', 72),
+		'main_game_font':       ('Elementary_Gothic_Scaled.ttf', 24),
+		'session_display_font': ('Elementary_Gothic_Scaled.ttf', 12),
+		'correct_font':         ('Elementary_Gothic_Scaled.ttf', 50),
+		'meaning_font':         ('Helvetica-Normal.ttf', 26),
+		'example_font':         ('Helvetica-Normal.ttf', 18),
+	}
+
+	def __init__(self, root, storage_backend, session_mix=None):
+		self.root = root
+		self.storage_backend = storage_backend
+		self.session_mix = session_mix
+		self.timings = {}
+		self.text = TextCache()
+
+	def __getattr__(self, name):
+		# Fonts are loaded on first access and then kept as plain attributes
+		if name not in AppContext.fonts:
+			raise AttributeError(name)
+		if not pygame.font.get_init():
+			pygame.font.init()
+		filename, size = AppContext.fonts[name]
+		font = pygame.font.Font(str(self.root / 'assets' / filename), size)
+		setattr(self, name, font)
+		return font
+
+	def timed(self, name, load):
+		start = time.perf_counter()
+		result = load()
+		self.timings[name] = time.perf_counter() - start
+		return result
+
+	@cached_property
+	def vocabulary(self):
+		return self.timed('vocabulary', 
+			lambda: load_deck_or_vocabulary(self.root / 'game_data'))
+
+	@cached_property
+	def storage(self):
+		return self.timed('storage', lambda: open_storage(
+			self.storage_backend, self.root / 'game_data', self.vocabulary))
+
+	@cached_property
+	def progress(self):
+		progress = self.timed('progress', self.storage.load)
+		progress.session_mix = self.session_mix
+		return progress
+
+	def close(self):
+		"""Let the storage finish writing, if it was ever opened"""
+		if 'storage' in self.__dict__:
+			self.storage.close()
+
+app = AppContext(root, storage_backend, session_mix)
 
-# Constants --------------------------------------------------------------
-title_font           = pygame.font.Font(str(root / "assets" / 'GoodUnicornRegular-Rxev.ttf'), 72)
-main_game_font       = pygame.font.Font(str(root / "assets" / 'Elementary_Gothic_Scaled.ttf'), 24)
-session_display_font = pygame.font.Font(str(root / "assets" / 'Elementary_Gothic_Scaled.ttf'), 12)
-correct_font         = pygame.font.Font(str(root / "assets" / 'Elementary_Gothic_Scaled.ttf'), 50)
-meaning_font         = pygame.font.Font(str(root / "assets" / 'Helvetica-Normal.ttf'), 26)
-example_font         = pygame.font.Font(str(root / "assets" / 'Helvetica-Normal.ttf'), 18)
 
+# Constants --------------------------------------------------------------
 screen_width = 1200
 screen_height = 675
 screen_rect = Rect(0, 0, screen_width, screen_height)
@@ -54,56 +147,57 @@ class WordCard(pygame.sprite.Sprite):
 		self.showing_example = False
 		self.showing_letter = False
 
-		self.entry.example = self.entry.example.replace(self.entry.word, 
+		# Hide the word in the example without touching the shared entry
+		self.example = self.entry.example.replace(self.entry.word, 
 								str('*'*len(self.entry.word)) )
 
+		# Rendered text, kept for the next frames (see calculate_layout)
+		self.layout = None
+		self.layout_key = None
+		self.calculate_layout()
+
 	def update(self):
 		pass
 
 	def check_validity(self):
-		if len(self.entry.word) > 3 and len(self.entry.meaning) > 5:
-			self.validity = True
-			return True
-		else:
-			self.validity =  False
-			return False
-
-	def calculate_layout(self):
-		#n_lines = 20*len(str(self.entry.meaning + self.entry.example))//self.rect.w
-		#chars_per_line = len(self.entry.meaning)//n_lines
-		width_limit = 0.65*self.rect.w
-
-		meaning_words = self.entry.meaning.split(' ')
-		m_line_surfs = []
-		current_line = ''
-		current_width = 0
-		for word in meaning_words:
-			word_surf = meaning_font.render(word, True, white)
-			current_width += word_surf.get_width()
-			if current_width < width_limit:
-				current_line += str(word + ' ')
-			else:
-				m_line_surfs.append(meaning_font.render(current_line.rstrip(), True, white))
-				current_width = 0
-				current_line = word + ' '
-		m_line_surfs.append(meaning_font.render(current_line.rstrip(), True, white))
+		self.validity = self.entry.is_valid()
+		return self.validity
 
-		example_words = self.entry.example.split(' ')
-		ex_line_surfs = []
+	def wrap(self, text, font, width_limit):
+		"""Lines of text no wider than width_limit, rendered with font. Words
+		are measured with Font.size, each line is rendered once"""
+		line_surfs = []
 		current_line = ''
 		current_width = 0
-		for word in example_words:
-			word_surf = example_font.render(word, True, white)
-			current_width += word_surf.get_width()
+		for word in text.split(' '):
+			current_width += font.size(word)[0]
 			if current_width < width_limit:
 				current_line += str(word + ' ')
 			else:
-				ex_line_surfs.append(example_font.render(current_line.rstrip(), True, white))
+				line_surfs.append(app.text.render(font, current_line.rstrip(), True, white))
 				current_width = 0
 				current_line = word + ' '
-		ex_line_surfs.append(example_font.render(current_line.rstrip(), True, white))
+		line_surfs.append(app.text.render(font, current_line.rstrip(), True, white))
+		return line_surfs
 
-		return {'meaning':m_line_surfs, 'example':ex_line_surfs}
+	def calculate_layout(self):
+		"""Surfaces of the letter tiles and of the lines of the meaning and 
+		the example. They are only rendered again when the entry, the width of
+		the card or the fonts change"""
+		fonts = (app.main_game_font, app.meaning_font, app.example_font)
+		key = (self.entry.key, self.rect.w, fonts, self.example)
+		if self.layout is not None and self.layout_key == key:
+			return self.layout
+		#n_lines = 20*len(str(self.entry.meaning + self.entry.example))//self.rect.w
+		#chars_per_line = len(self.entry.meaning)//n_lines
+		width_limit = 0.65*self.rect.w
+		self.layout = {
+			'tiles': app.text.render(app.main_game_font, str('_ '*len(self.entry.word)), True, white),
+			'meaning': self.wrap(self.entry.meaning, app.meaning_font, width_limit),
+			'example': self.wrap(self.example, app.example_font, width_limit),
+			'no_example': app.text.render(app.example_font, 'No example available', True, white)}
+		self.layout_key = key
+		return self.layout
 
 	def draw(self, surface):
 		"""Draw lines indicating letters and meaning underneath"""
@@ -111,20 +205,18 @@ class WordCard(pygame.sprite.Sprite):
 		#self.image.fill(black)
 		surface.fill(black, self.rect)
 
+		linesurfs = self.calculate_layout()
+
 		# Letter tiles
-		tiles = str('_ '*len(self.entry.word))
-		tiles_surf = main_game_font.render(tiles, True, white)
+		tiles_surf = linesurfs['tiles']
 		surface.blit(tiles_surf, 
 			( (self.rect.x, 10), tiles_surf.get_size() ))
 
 		if self.showing_letter:
-			first_letter = main_game_font.render(self.entry.word[0], True, white)
+			first_letter = app.text.render(app.main_game_font, self.entry.word[0], True, white)
 			surface.blit(first_letter, 
 				( (self.rect.x, 10), first_letter.get_size() ))
 
-
-		linesurfs = self.calculate_layout()
-		
 		# Meaning
 		y_offset = 5
 		for i in range(len(linesurfs['meaning'])):
@@ -143,7 +235,7 @@ class WordCard(pygame.sprite.Sprite):
 		# Example
 		if self.showing_example:
 			y_offset += 15
-			if len(self.entry.example) > 5:
+			if len(self.example) > 5:
 				for i in range(len(linesurfs['example'])):
 
 					curr_line_surf = linesurfs['example'][i]
@@ -154,7 +246,7 @@ class WordCard(pygame.sprite.Sprite):
 
 					y_offset += curr_line_heigth + 5
 			else:
-				no_example_surf = example_font.render('No example available', True, white)
+				no_example_surf = linesurfs['no_example']
 				no_ex_w, no_ex_h = no_example_surf.get_size()
 				surface.blit(no_example_surf,
 						(self.rect.x+5, self.rect.top+y_offset, no_ex_w, no_ex_h))
@@ -162,11 +254,18 @@ class WordCard(pygame.sprite.Sprite):
 		pygame.draw.rect(surface, white, self.rect, 5)
 		#surface.blit(self.image, self.rect)
 
+	def area(self):
+		"""Part of the screen the card draws on: the card, and the tiles above
+		it with room for the word once revealed"""
+		solution = app.text.render(app.main_game_font, '  '.join(self.entry.word), True, white)
+		return pygame.Rect(self.rect.x, 0, max(self.rect.w, solution.get_width()), 
+						self.rect.bottom)
+
 	def reveal(self, surface):
 		"""Render the word with the letters on the tiles"""
 
 		solution = '  '.join(list(self.entry.word))
-		solution_surf = main_game_font.render(solution, True, white)
+		solution_surf = app.text.render(app.main_game_font, solution, True, white)
 
 		surface.blit(solution_surf, 
 			( (self.rect.x, 7), solution_surf.get_size() ))
@@ -174,7 +273,8 @@ class WordCard(pygame.sprite.Sprite):
 class SessionDisplay(pygame.sprite.Sprite):
 	"""Meant for Stack Gallery: Display session summary (card number, n_correct,
 	n_wrong, color depending on completion) and expand to show individual
-	WordEntries as EntryDisplay sprites when clicked"""
+	WordEntries as EntryDisplay sprites when clicked.
+	Takes a SessionSummary: entries are only looked up when expanded"""
 	def __init__(self, session, rect=(0,0,75,75), *groups):
 		super().__init__(*groups)
 		self.rect = pygame.Rect(rect)
@@ -184,16 +284,16 @@ class SessionDisplay(pygame.sprite.Sprite):
 		self.expanded = False
 		self.color = green if self.completed else yellow
 		self.stats = {
-		'total':session_display_font.render(str(len(self.session.stack)), True, black),
-		'active':session_display_font.render(str(len(self.session.active_stack)), True, black),
-		'known':session_display_font.render(str(len(self.session.known)), True, khaki),
-		'unknown':session_display_font.render(str(len(self.session.unknown)), True, darkred)}
+		'total':app.text.render(app.session_display_font, str(len(self.session.stack)), True, black),
+		'queued':app.text.render(app.session_display_font, str(self.session.queued), True, black),
+		'known':app.text.render(app.session_display_font, str(len(self.session.known)), True, khaki),
+		'unknown':app.text.render(app.session_display_font, str(len(self.session.unknown)), True, darkred)}
 		
 		# Create image
 		self.image.fill(self.color)
 		self.rel_rect = self.image.get_rect() # Relative coordinates of image
 		self.image.blit(self.stats['total'], self.rel_rect.topleft)
-		self.image.blit(self.stats['active'], self.rel_rect.midtop)
+		self.image.blit(self.stats['queued'], self.rel_rect.midtop)
 		self.image.blit(self.stats['known'], self.rel_rect.midleft)
 		self.image.blit(self.stats['unknown'], self.rel_rect.center)
 		
@@ -213,13 +313,14 @@ class SessionDisplay(pygame.sprite.Sprite):
 
 		# Gather all WordEntries and instance EntryDisplays out of them
 		# Divide stack in two and display one half at a time
+		entries = self.session.entries(app.vocabulary)
 		entry_displays_1 = pygame.sprite.RenderUpdates()
-		for entry in self.session.stack[:int(len(self.session.stack)/2)]:
-			entrydisp = EntryDisplay(entry)
+		for entry in entries[:int(len(entries)/2)]:
+			entrydisp = EntryDisplay(entry, stat=app.progress.stats[entry.id])
 			entry_displays_1.add(entrydisp)
 		entry_displays_2 = pygame.sprite.RenderUpdates()
-		for entry in self.session.stack[int(len(self.session.stack)/2):]:
-			entrydisp = EntryDisplay(entry)
+		for entry in entries[int(len(entries)/2):]:
+			entrydisp = EntryDisplay(entry, stat=app.progress.stats[entry.id])
 			entry_displays_2.add(entrydisp)
 
 		# Assign coordinates in grid to each WordDisplay
@@ -271,8 +372,9 @@ class SessionDisplay(pygame.sprite.Sprite):
 
 			surface.fill(yellow)
 			
-			for event in pygame.event.get():
+			for event in pacer.events():
 				if event.type == pygame.QUIT:
+					app.close()
 					pygame.quit()
 					sys.exit()
 				elif event.type == MOUSEBUTTONUP:
@@ -305,7 +407,7 @@ class SessionDisplay(pygame.sprite.Sprite):
 			surface.blit(collapse_surf, collapse_button)
 			rects_to_refresh += [collapse_button, switch_button]
 			pygame.display.update(rects_to_refresh)
-			fpsClock.tick(fps)
+			pacer.tick()
 
 			if not self.expanded:
 				surface.fill(black)
@@ -317,18 +419,20 @@ class EntryDisplay(pygame.sprite.Sprite):
 	An EntryDisplay has two sides: front (word + category) and 
 	back (meaning + example). Each side has its own image (Surface)
 	and depending on the status of the sprite (if it has been clicked),
-	the sprite's reference image is chosen as one of the two sides."""
-	def __init__(self, entry, rect=(0,0,25,25), *groups):
+	the sprite's reference image is chosen as one of the two sides.
+	The back also shows how the word went so far, from the WordStat given"""
+	def __init__(self, entry, rect=(0,0,25,25), stat=None, *groups):
 		super().__init__(*groups)
 		self.center = (0,0)
 		self.rect = pygame.Rect(rect)
 		self.image = pygame.Surface(self.rect.size)
 		self.entry = entry
+		self.stat = stat
 		self.face = 'front'
 
 		# Adapt image dimensions to word
-		word = main_game_font.render(self.entry.word, True, black)
-		category = session_display_font.render(self.entry.category, True, black)
+		word = app.text.render(app.main_game_font, self.entry.word, True, black)
+		category = app.text.render(app.session_display_font, self.entry.category, True, black)
 		dim = (max(self.image.get_width(), 1.05*word.get_width(), 1.2*category.get_width()),
 			max(self.image.get_height(), 1.05*(word.get_height() + category.get_height()) ))
 
@@ -349,36 +453,40 @@ class EntryDisplay(pygame.sprite.Sprite):
 		current_line = ''
 		current_width = 0
 		for word in meaning_words:
-			word_surf = meaning_font.render(word, True, white)
-			current_width += word_surf.get_width()
+			current_width += app.meaning_font.size(word)[0]
 			if current_width < width_limit:
 				current_line += str(word + ' ')
 			else:
-				m_line_surfs.append(meaning_font.render(current_line.rstrip(), True, black))
+				m_line_surfs.append(app.text.render(app.meaning_font, current_line.rstrip(), True, black))
 				current_width = 0
 				current_line = word + ' '
-		m_line_surfs.append(meaning_font.render(current_line.rstrip(), True, black))
+		m_line_surfs.append(app.text.render(app.meaning_font, current_line.rstrip(), True, black))
 
 		example_words = self.entry.example.split(' ')
 		ex_line_surfs = []
 		current_line = ''
 		current_width = 0
 		for word in example_words:
-			word_surf = example_font.render(word, True, white)
-			current_width += word_surf.get_width()
+			current_width += app.example_font.size(word)[0]
 			if current_width < width_limit:
 				current_line += str(word + ' ')
 			else:
-				ex_line_surfs.append(example_font.render(current_line.rstrip(), True, black))
+				ex_line_surfs.append(app.text.render(app.example_font, current_line.rstrip(), True, black))
 				current_width = 0
 				current_line = word + ' '
-		ex_line_surfs.append(example_font.render(current_line.rstrip(), True, black))
+		ex_line_surfs.append(app.text.render(app.example_font, current_line.rstrip(), True, black))
+
+		stat_line_surfs = []
+		if self.stat is not None and self.stat.shown:
+			stat_line_surfs.append(app.text.render(app.example_font, 
+				'Seen {}: {} right, {} missed, {} revealed'.format(self.stat.shown, 
+				self.stat.correct, self.stat.missed, self.stat.revealed), True, black))
 
-		return {'meaning':m_line_surfs, 'example':ex_line_surfs}
+		return {'meaning':m_line_surfs, 'example':ex_line_surfs, 'stats':stat_line_surfs}
 
 	def draw_back_image(self):
 		lines = self.calculate_linebreaks(limit=0.2*screen_width)
-		all_lines = lines['meaning'] + lines['example']
+		all_lines = lines['meaning'] + lines['example'] + lines['stats']
 		back_image_size = (1.05*max([line.get_width() for line in all_lines]),
 						1.05*sum([10+line.get_height() for line in all_lines]) )
 		back_image = pygame.Surface(back_image_size)
@@ -405,10 +513,17 @@ class EntryDisplay(pygame.sprite.Sprite):
 					(5, y_offset, curr_line_width, curr_line_heigth))
 				y_offset += curr_line_heigth + 5
 		else:
-			no_example_surf = example_font.render('No example available', True, white)
+			no_example_surf = app.text.render(app.example_font, 'No example available', True, white)
 			no_ex_w, no_ex_h = no_example_surf.get_size()
 			back_image.blit(no_example_surf,
 					(5, y_offset, no_ex_w, no_ex_h))
+			y_offset += no_ex_h + 5
+
+		# Stats
+		y_offset += 10
+		for curr_line_surf in lines['stats']:
+			back_image.blit(curr_line_surf, (5, y_offset))
+			y_offset += curr_line_surf.get_height() + 5
 
 		pygame.draw.rect(back_image, white, back_image.get_rect(), 5)
 
@@ -444,210 +559,105 @@ class EntryDisplay(pygame.sprite.Sprite):
 			self.rect.right = 0.98*screen_width
 
 class Hangman:
-
-	def __init__(self, step=0):
-		self.image = pygame.Surface((0.8*screen_width//2, 0.85*screen_height)).convert()
-		self.rect = self.image.get_rect()
+	"""The gallows and the hanged man, one part more for every wrong guess.
+	The image of every step is drawn once, each on top of a copy of the one 
+	before, and kept in stages. They are only drawn again when the size or 
+	the colors of the hangman change"""
+	steps = 8
+
+	def __init__(self, step=0, background=gray, color=white):
+		self.rect = pygame.Rect(0, 0, 0.8*screen_width//2, 0.85*screen_height)
 		self.rect.center = (3*screen_width//4, screen_height//2)
 		self.rect.top = 0.1*screen_height
 		self.step = step
+		self.background = background
+		self.color = color
+		self.stages = None
+		self.stages_key = None
+		self.image = self.stage()
 
 	def update(self, newstep):
 		self.step = newstep
 
-	def draw(self, surface):
+	def stage(self):
+		"""Image of the current step, drawing the stages again if needed"""
+		key = (self.rect.size, self.background, self.color)
+		if self.stages_key != key:
+			image = pygame.Surface(self.rect.size).convert()
+			self.stages = []
+			for step in range(self.steps):
+				self.draw_part(image, step)
+				self.stages.append(image.copy())
+			self.stages_key = key
+		return self.stages[min(self.step, self.steps-1)]
+
+	def draw_part(self, image, step):
+		"""Draw on image the part added at step"""
 		wood_width = 5
 		person_width = 2
-		if self.step == 0:
+		w, h = image.get_size()
+		circle_center = (w//2, 2*h//8)
+		circle_radius = h//8
+		if step == 0:
 			# Background + Frame
-			self.image.fill(gray)
-			pygame.draw.rect(self.image, white, ((0,0), self.image.get_size()), 3)
-
-			surface.blit(self.image, self.rect)
-
-		elif self.step == 1:
-			# Background + Frame
-			self.image.fill(gray)
-			pygame.draw.rect(self.image, white, ((0,0), self.image.get_size()), 3)
-			# Horizontal Base
-			pygame.draw.line(self.image, white, (0, 0.95*self.rect.h),
-							(self.rect.w, 0.95*self.rect.h), wood_width)
-
-			surface.blit(self.image, self.rect)
-
-		elif self.step == 2:
-			# Background + Frame
-			self.image.fill(gray)
-			pygame.draw.rect(self.image, white, ((0,0), self.image.get_size()), 3)
+			image.fill(self.background)
+			pygame.draw.rect(image, self.color, ((0,0), image.get_size()), 3)
+		elif step == 1:
 			# Horizontal Base
-			pygame.draw.line(self.image, white, (0, 0.95*self.rect.h),
-							(self.rect.w, 0.95*self.rect.h), wood_width)
+			pygame.draw.line(image, self.color, (0, 0.95*h), (w, 0.95*h), wood_width)
+		elif step == 2:
 			# Vertical Base
-			pygame.draw.line(self.image, white, (20, 0.95*self.rect.h), 
-							(20, 20), wood_width)
-
-			surface.blit(self.image, self.rect)
-
-		elif self.step == 3:
-			# Background + Frame
-			self.image.fill(gray)
-			pygame.draw.rect(self.image, white, ((0,0), self.image.get_size()), 3)
-			# Horizontal Base
-			pygame.draw.line(self.image, white, (0, 0.95*self.rect.h),
-							(self.rect.w, 0.95*self.rect.h), wood_width)
-			# Vertical Base
-			pygame.draw.line(self.image, white, (20, 0.95*self.rect.h), 
-							(20, 20), wood_width)
+			pygame.draw.line(image, self.color, (20, 0.95*h), (20, 20), wood_width)
+		elif step == 3:
 			# Horizontal upper stick + rope
-			pygame.draw.lines(self.image, white, False,
-					[(20,20), (self.rect.w//2, 20), (self.rect.w//2, self.rect.h//8)], 
-					wood_width)
-
-			surface.blit(self.image, self.rect)
-
-		elif self.step == 4:
-			# Background + Frame
-			self.image.fill(gray)
-			pygame.draw.rect(self.image, white, ((0,0), self.image.get_size()), 3)
-			# Horizontal Base
-			pygame.draw.line(self.image, white, (0, 0.95*self.rect.h),
-							(self.rect.w, 0.95*self.rect.h), wood_width)
-			# Vertical Base
-			pygame.draw.line(self.image, white, (20, 0.95*self.rect.h), 
-							(20, 20), wood_width)
-			# Horizontal upper stick + rope
-			pygame.draw.lines(self.image, white, False,
-					[(20,20), (self.rect.w//2, 20), (self.rect.w//2, self.rect.h//8)], 
-					wood_width)
+			pygame.draw.lines(image, self.color, False,
+					[(20,20), (w//2, 20), (w//2, h//8)], wood_width)
+		elif step == 4:
 			# Head
-			circle_center = (self.rect.w//2, 2*self.rect.h//8)
-			circle_radius = self.rect.h//8
-			pygame.draw.circle(self.image, white, circle_center, circle_radius, person_width)
-
-			surface.blit(self.image, self.rect)
-
-		elif self.step == 5:
-			# Background + Frame
-			self.image.fill(gray)
-			pygame.draw.rect(self.image, white, ((0,0), self.image.get_size()), 3)
-			# Horizontal Base
-			pygame.draw.line(self.image, white, (0, 0.95*self.rect.h),
-							(self.rect.w, 0.95*self.rect.h), wood_width)
-			# Vertical Base
-			pygame.draw.line(self.image, white, (20, 0.95*self.rect.h), 
-							(20, 20), wood_width)
-			# Horizontal upper stick + rope
-			pygame.draw.lines(self.image, white, False,
-					[(20,20), (self.rect.w//2, 20), (self.rect.w//2, self.rect.h//8)], 
-					wood_width)
-			# Head
-			circle_center = (self.rect.w//2, 2*self.rect.h//8)
-			circle_radius = self.rect.h//8
-			pygame.draw.circle(self.image, white, circle_center, circle_radius, person_width)
-			# Body
-			pygame.draw.line(self.image, white, 
-				(self.rect.w//2, circle_center[1]+circle_radius),
-				(self.rect.w//2, 3*self.rect.h//5), person_width)
-
-			surface.blit(self.image, self.rect)
-
-		elif self.step == 6:
-			# Background + Frame
-			self.image.fill(gray)
-			pygame.draw.rect(self.image, white, ((0,0), self.image.get_size()), 3)
-			# Horizontal Base
-			pygame.draw.line(self.image, white, (0, 0.95*self.rect.h),
-							(self.rect.w, 0.95*self.rect.h), wood_width)
-			# Vertical Base
-			pygame.draw.line(self.image, white, (20, 0.95*self.rect.h), 
-							(20, 20), wood_width)
-			# Horizontal upper stick + rope
-			pygame.draw.lines(self.image, white, False,
-					[(20,20), (self.rect.w//2, 20), (self.rect.w//2, self.rect.h//8)], 
-					wood_width)
-			# Head
-			circle_center = (self.rect.w//2, 2*self.rect.h//8)
-			circle_radius = self.rect.h//8
-			pygame.draw.circle(self.image, white, circle_center, circle_radius, person_width)
+			pygame.draw.circle(image, self.color, circle_center, circle_radius, person_width)
+		elif step == 5:
 			# Body
-			pygame.draw.line(self.image, white, 
-				(self.rect.w//2, circle_center[1]+circle_radius),
-				(self.rect.w//2, 3*self.rect.h//5), person_width)
+			pygame.draw.line(image, self.color, 
+				(w//2, circle_center[1]+circle_radius), (w//2, 3*h//5), person_width)
+		elif step == 6:
 			# Legs
-			pygame.draw.lines(self.image, white, False,
-					[(self.rect.w//3, 7*self.rect.h//8),
-					(self.rect.w//2, 3*self.rect.h//5),
-					(2*self.rect.w//3, 7*self.rect.h//8)], person_width)
-
-			surface.blit(self.image, self.rect)
-
-		elif self.step == 7:
-			# Background + Frame
-			self.image.fill(gray)
-			pygame.draw.rect(self.image, white, ((0,0), self.image.get_size()), 3)
-			# Horizontal Base
-			pygame.draw.line(self.image, white, (0, 0.95*self.rect.h),
-							(self.rect.w, 0.95*self.rect.h), wood_width)
-			# Vertical Base
-			pygame.draw.line(self.image, white, (20, 0.95*self.rect.h), 
-							(20, 20), wood_width)
-			# Horizontal upper stick + rope
-			pygame.draw.lines(self.image, white, False,
-					[(20,20), (self.rect.w//2, 20), (self.rect.w//2, self.rect.h//8)], 
-					wood_width)
-			# Head
-			circle_center = (self.rect.w//2, 2*self.rect.h//8)
-			circle_radius = self.rect.h//8
-			pygame.draw.circle(self.image, white, circle_center, circle_radius, person_width)
-			# Body
-			pygame.draw.line(self.image, white, 
-				(self.rect.w//2, circle_center[1]+circle_radius),
-				(self.rect.w//2, 3*self.rect.h//5), person_width)
-			# Legs
-			pygame.draw.lines(self.image, white, False,
-					[(self.rect.w//3, 7*self.rect.h//8),
-					(self.rect.w//2, 3*self.rect.h//5),
-					(2*self.rect.w//3, 7*self.rect.h//8)], person_width)
+			pygame.draw.lines(image, self.color, False,
+					[(w//3, 7*h//8), (w//2, 3*h//5), (2*w//3, 7*h//8)], person_width)
+		elif step == 7:
 			# Arms
-			pygame.draw.lines(self.image, white, False,
-					[(2*self.rect.w//8, 1.2*circle_center[1]+circle_radius),
-					(self.rect.w//2, self.rect.h//2),
-					(6*self.rect.w//8, 1.2*circle_center[1]+circle_radius)], person_width)
+			pygame.draw.lines(image, self.color, False,
+					[(2*w//8, 1.2*circle_center[1]+circle_radius),
+					(w//2, h//2),
+					(6*w//8, 1.2*circle_center[1]+circle_radius)], person_width)
 			# Dead eyes
 			eye_sep = 15; eye_width = 5; eye_height = 5
-			pygame.draw.line(self.image, white,
-					(circle_center[0]-eye_sep-eye_width, circle_center[1]-eye_height),
-					(circle_center[0]-eye_sep+eye_width, circle_center[1]+eye_height),
-					person_width)
-			pygame.draw.line(self.image, white,
-					(circle_center[0]-eye_sep-eye_width, circle_center[1]+eye_height),
-					(circle_center[0]-eye_sep+eye_width, circle_center[1]-eye_height),
-					person_width)
-			pygame.draw.line(self.image, white,
-					(circle_center[0]+eye_sep-eye_width, circle_center[1]-eye_height),
-					(circle_center[0]+eye_sep+eye_width, circle_center[1]+eye_height),
-					person_width)
-			pygame.draw.line(self.image, white,
-					(circle_center[0]+eye_sep-eye_width, circle_center[1]+eye_height),
-					(circle_center[0]+eye_sep+eye_width, circle_center[1]-eye_height),
-					person_width)
-			surface.blit(self.image, self.rect)
+			for x in (circle_center[0]-eye_sep, circle_center[0]+eye_sep):
+				pygame.draw.line(image, self.color,
+						(x-eye_width, circle_center[1]-eye_height),
+						(x+eye_width, circle_center[1]+eye_height), person_width)
+				pygame.draw.line(image, self.color,
+						(x-eye_width, circle_center[1]+eye_height),
+						(x+eye_width, circle_center[1]-eye_height), person_width)
+
+	def draw(self, surface):
+		self.image = self.stage()
+		surface.blit(self.image, self.rect)
 
 class MenuButton(pygame.sprite.Sprite):
 	"""Class for generic menu buttons, both for main and pause screens"""
 
-	def __init__(self, text='Some button', subtext = None, fontObj=main_game_font, 
+	def __init__(self, text='Some button', subtext = None, fontObj=None, 
 	font_color=black, bg_color=yellow, highlight_bg_color=white,
 	bg_rect=(0,0,60,20), *groups, **args):
 
 		# Initialize parent class
 		super().__init__(*groups)
 		# Font-related attributes
-		self.font = fontObj
+		self.font = fontObj if fontObj is not None else app.main_game_font
 		self.text = text
 		self.subtext = subtext
 		self.font_color = font_color
-		self.font_surface = self.font.render(self.text, True, self.font_color)
+		self.font_surface = app.text.render(self.font, self.text, True, self.font_color)
 		self.font_rect = self.font_surface.get_rect()
 		
 		# Background rect attributes
@@ -701,7 +711,7 @@ class InputBox():
 		self.original_w = self.rect.w
 		self.color = blue
 		self.text = text
-		self.txt_surface = main_game_font.render(text, True, self.color)
+		self.txt_surface = app.text.render(app.main_game_font, text, True, self.color)
 		self.active = False
 
 	def handle_event(self, event):
@@ -719,7 +729,7 @@ class InputBox():
 				if event.key == K_RETURN:			
 					answer = self.text
 					self.text = ''
-					self.txt_surface = main_game_font.render(self.text, True, self.color)
+					self.txt_surface = app.text.render(app.main_game_font, self.text, True, self.color)
 					return answer
 			
 				elif event.key == K_BACKSPACE:
@@ -727,7 +737,7 @@ class InputBox():
 				else:
 					self.text += event.unicode
 				# Re-render the text.
-				self.txt_surface = main_game_font.render(self.text, True, self.color)
+				self.txt_surface = app.text.render(app.main_game_font, self.text, True, self.color)
 			else:
 				# NOTE
 				# This line root "fixes" the bug that makes the game quit when 
@@ -740,16 +750,92 @@ class InputBox():
 		width = max(self.original_w, self.txt_surface.get_width()+10)
 		self.rect.w = width
 
+	def text_area(self):
+		return self.txt_surface.get_rect(topleft=(self.rect.x+5, self.rect.y+5))
+
+	def draw_text(self, screen):
+		screen.blit(self.txt_surface, (self.rect.x+5, self.rect.y+5))
+
+	def draw_box(self, screen):
+		pygame.draw.rect(screen, self.color, self.rect, 2)
+
 	def draw(self, screen):
 		# Blit the text.
-		screen.blit(self.txt_surface, (self.rect.x+5, self.rect.y+5))
+		self.draw_text(screen)
 		# Blit the rect.
-		pygame.draw.rect(screen, self.color, self.rect, 2)
+		self.draw_box(screen)
+
+
+class Scene():
+	"""Retained-mode screen. A widget is an area of the screen, a function 
+	that draws it and the state it shows. Widgets are only drawn again when
+	show() gives them a new state, and only the areas that changed are 
+	updated on the display. Widgets overlapping a changed area are drawn 
+	again in it, in the order they were added"""
+	def __init__(self, surface, color=background):
+		self.surface = surface
+		self.color = color
+		self.widgets = {} # name: [draw, area, state, area last drawn, dirty]
+		self.everything = True
+
+	def add(self, name, draw, area, state=None):
+		"""area is a Rect, or a function returning the Rect the widget covers"""
+		self.widgets[name] = [draw, area, state, None, True]
+
+	def show(self, name, state):
+		widget = self.widgets[name]
+		if widget[2] != state:
+			widget[2] = state
+			widget[4] = True
+
+	def invalidate(self):
+		"""Draw everything again, e.g. after something drew over the scene"""
+		self.everything = True
+
+	def area(self, widget):
+		area = widget[1]
+		return pygame.Rect(area() if callable(area) else area)
+
+	def draw(self):
+		"""Draw the widgets that changed and update their areas on the display.
+		Returns the rects that were updated"""
+		if self.everything:
+			rects = [self.surface.get_rect()]
+		else:
+			rects = []
+			for widget in self.widgets.values():
+				if widget[4]:
+					rects.append(self.area(widget))
+					if widget[3] is not None and widget[3] != rects[-1]:
+						rects.append(widget[3])
+			# Merge overlapping areas, so that no pixel is drawn twice
+			merged = []
+			for rect in rects:
+				i = rect.collidelist(merged)
+				while i != -1:
+					rect = rect.union(merged.pop(i))
+					i = rect.collidelist(merged)
+				merged.append(rect)
+			rects = merged
+		for rect in rects:
+			self.surface.fill(self.color, rect)
+		for widget in self.widgets.values():
+			widget[3] = self.area(widget)
+			widget[4] = False
+			for rect in rects:
+				if widget[3].colliderect(rect):
+					self.surface.set_clip(rect)
+					widget[0](self.surface)
+		self.surface.set_clip(None)
+		self.everything = False
+		if rects:
+			pygame.display.update(rects)
+		return rects
 
 
 # Functions --------------------------------------------------------------
 def main():
-	# pygame.init()
+	pygame.init()
 	# load and set the logo
 	# logo = pygame.image.load("logo32x32.png")
 	# pygame.display.set_icon(logo)
@@ -780,11 +866,11 @@ def show_start_screen(surface):
 
 	# Draw title
 	# TODO: abstract as function?
-	title_surf = title_font.render('GRE Vocabulary', True, yellow)
+	title_surf = app.text.render(app.title_font, 'GRE Vocabulary', True, yellow)
 	title_surf_rect = title_surf.get_rect()
 	title_surf_rect.center = screen_rect.center
 	title_surf_rect.y = mayor_grid_y[0]//2
-	title2_surf = title_font.render('Flashcards!', True, yellow)
+	title2_surf = app.text.render(app.title_font, 'Flashcards!', True, yellow)
 	title2_surf_rect = title2_surf.get_rect()
 	title2_surf_rect.midtop = title_surf_rect.midbottom
 	title2_surf_rect.y *= 1.1
@@ -798,10 +884,9 @@ def show_start_screen(surface):
 	menu_buttons = pygame.sprite.RenderUpdates(start_game, see_stacks, exit)
 
 	# main screen loop
+	redraw = True
 	while showing_main_menu:
 		
-		surface.blits([(title_surf, title_surf_rect), (title2_surf, title2_surf_rect)])
-		
 		mousex, mousey = 0, 0
 		mouseClicked, mouseReleased = False, False
 		
@@ -809,9 +894,11 @@ def show_start_screen(surface):
 		[button.resurrect() for button in menu_buttons]
 
 		# Event handling
-		for event in pygame.event.get():
+		events = pacer.events()
+		for event in events:
 			if event.type == pygame.QUIT:
 				showing_main_menu = False
+				app.close()
 				pygame.quit()
 				sys.exit()
 			
@@ -829,23 +916,35 @@ def show_start_screen(surface):
 			elif mouseReleased:
 				button.is_clicked = False
 
-		menu_buttons.draw(surface)
-		menu_buttons.update(surface)
-		pygame.display.update()
-		fpsClock.tick(fps)
+		# The menu only changes when something happens
+		if redraw or events:
+			surface.blits([(title_surf, title_surf_rect), (title2_surf, title2_surf_rect)])
+			menu_buttons.draw(surface)
+			menu_buttons.update(surface)
+			pygame.display.update()
+			redraw = False
+		if 'first_frame' not in app.timings:
+			app.timings['first_frame'] = time.perf_counter() - start_time
+			if app.timings['first_frame'] > startup_budget:
+				print('Start screen took {:.2f}s to show, over the {:.2f}s budget'
+					.format(app.timings['first_frame'], startup_budget), file=sys.stderr)
+		pacer.tick()
 
 		# If button pressed, perform its action
 		if start_game.rect.collidepoint((mousex, mousey)) and mouseReleased:
 			surface.fill(black)
 			pygame.display.update()
 			run_game(surface=mainsurface)
+			redraw = True
 
 		if see_stacks.rect.collidepoint((mousex, mousey)) and mouseReleased:
 			surface.fill(black)
 			pygame.display.update()
 			show_stacks(surface=mainsurface)
+			redraw = True
 
 		if exit.rect.collidepoint((mousex, mousey)) and mouseReleased:
+			app.close()
 			pygame.quit()
 			sys.exit()
 
@@ -856,22 +955,23 @@ def run_game(surface):
 	
 	surface.fill(background)
 
-	# Either load an unfinished session or initialize a new one
-	try:
-		current_session = load_session('current_session.obj')
-	except:
-		current_session = master_session.sampleN_pop(50)
-
-	# Try importing session history or initialize a history object
-	try:
-		old_sessions = load_session('old_sessions.obj')
-	except:
-		old_sessions = []
-
-	# If last session is completed, create a new one
-	if current_session.completed:
-		old_sessions.append(current_session)
-		current_session = master_session.sampleN_pop(50)		
+	# Continue the unfinished session, or start a new one if it is completed.
+	# The engine plays by the rules, this loop only shows it and feeds it input
+	progress, storage = app.progress, app.storage
+	engine = GameEngine(progress)
+	if engine.state == 'finished':
+		# No word left to play nor due for review
+		storage.save(progress)
+		surface.fill(black)
+		no_words_left_animation()
+		return
+
+	def leave():
+		# Every visit deals a new card: the one on screen goes to the front of
+		# the round queue, to be dealt first next time
+		if engine.state == 'guessing':
+			progress.put_back(engine.entry)
+		storage.save(progress)
 	
 	# Sort words into groups
 #	stock = pygame.sprite.Group()
@@ -886,10 +986,9 @@ def run_game(surface):
 	# TODO I could rewrite this piece using classes and stuff but for now it works
 	hangman = Hangman()	
 
-	# Choose a random word and make sure it is valid (has meaning)
-	shown_word = WordCard(entry=current_session.sample1())
-	while not shown_word.check_validity():
-			shown_word = WordCard(entry=current_session.sample1())
+	# Card dealt by the engine. Sessions only hold valid words (see 
+	# GameProgress.drop_invalid), so no need to check it
+	shown_word = WordCard(entry=engine.entry)
 	input_box = InputBox(screen_width//10, 3*screen_height//4,
 						screen_width//3, 0.8*screen_height//4)
 
@@ -911,7 +1010,7 @@ def run_game(surface):
 	help_button_rect = pygame.Rect((0,0,75,75))
 	help_button_rect.center = screen_rect.center
 	# help_button_rect.y += 90
-	question_mark = main_game_font.render('?', True, yellow)
+	question_mark = app.text.render(app.main_game_font, '?', True, yellow)
 	question_rect = question_mark.get_rect()
 	question_rect.center = help_button_rect.center
 
@@ -920,7 +1019,7 @@ def run_game(surface):
 	show_letter.center = screen_rect.center
 	show_letter.y += 90
 	show_letter_surf = pygame.Surface(show_letter.size)
-	show_a = main_game_font.render('A', True, yellow)
+	show_a = app.text.render(app.main_game_font, 'A', True, yellow)
 	show_a_rect = show_a.get_rect()
 	show_a_rect.midright = show_letter.center
 	pygame.draw.line(show_letter_surf, yellow, 
@@ -965,6 +1064,50 @@ def run_game(surface):
 					(main_menu_button.w//10, main_menu_button.h//2),
 					(main_menu_button.w//2, 3*main_menu_button.h//4)], 7)
 
+	# Widgets are only drawn again when what they show changes
+	def counter(rect, color, stack):
+		def draw(surface):
+			count = app.text.render(app.main_game_font, str(len(stack())), True, color)
+			pygame.draw.rect(surface, color, rect, 5)
+			surface.blit(count, count.get_rect(center=rect.center))
+		return draw
+
+	def draw_help_button(surface):
+		pygame.draw.rect(surface, yellow, help_button_rect, 5)
+		surface.blit(question_mark, question_rect)
+
+	def draw_show_letter(surface):
+		surface.blit(show_letter_surf, show_letter)
+		surface.blit(show_a, show_a_rect)
+		pygame.draw.rect(surface, yellow, show_letter, 5)
+
+	def draw_skip_word(surface):
+		surface.blit(arrow_surf, arrow_rect)
+		pygame.draw.rect(surface, blue, skip_word, 5)
+
+	def draw_show_word(surface):
+		surface.blit(show_word_surf, show_word)
+		pygame.draw.rect(surface, red, show_word, 5)
+
+	scene = Scene(surface)
+	scene.add('card', lambda surface: shown_word.draw(surface=surface), 
+			lambda: shown_word.area())
+	scene.add('input', input_box.draw_box, input_box.rect)
+	scene.add('input_text', input_box.draw_text, input_box.text_area)
+	scene.add('hangman', hangman.draw, hangman.rect)
+	scene.add('stack', counter(stack_count, white, lambda: progress.current.unseen), 
+			stack_count)
+	scene.add('correct', counter(correct_guesses, green, lambda: progress.current.known), 
+			correct_guesses)
+	scene.add('wrong', counter(wrong_guesses, red, lambda: progress.current.unknown), 
+			wrong_guesses)
+	scene.add('help', draw_help_button, help_button_rect)
+	scene.add('show_letter', draw_show_letter, show_letter)
+	scene.add('skip_word', draw_skip_word, skip_word)
+	scene.add('show_word', draw_show_word, show_word)
+	scene.add('main_menu', lambda surface: surface.blit(main_menu_surf, main_menu_button),
+			main_menu_button)
+
 	game_running = True
 	while game_running:
 		### Event handling variables ---
@@ -972,11 +1115,10 @@ def run_game(surface):
 		mouseClicked, mouseReleased = False, False
 
 		# Event handling
-		for event in pygame.event.get():
+		for event in pacer.events():
 			if event.type == pygame.QUIT:
-				save_session(old_sessions, 'old_sessions.obj')
-				save_session(current_session, 'current_session.obj')
-				save_session(master_session, 'master_session.obj')
+				leave()
+				app.close()
 				pygame.quit()
 				sys.exit()
 			
@@ -992,151 +1134,75 @@ def run_game(surface):
 
 			elif event.type == KEYDOWN and event.key == K_RETURN:
 				answer = input_box.handle_event(event)
-				if answer.lower() == shown_word.entry.word.lower():
+				state = engine.submit_guess(answer)
+				if state in ('solved', 'complete'):
 					shown_word.reveal(surface)
 					pygame.display.update()
-					hangman.step = 0
 					correct_word_animation()
+					if state == 'complete':
+						session_complete_animation()
+					engine.next()
+					scene.invalidate()
+				elif state == 'failed':
+					hangman.step = engine.mistakes
+					hangman.draw(surface=mainsurface)
+					surface.blit(hangman.image, hangman.rect)
+					pygame.display.update()
 
-					# Check if the word was already either known or unknown
-					word_already_unknown, word_already_known = False, False
-					for known_entry in current_session.known:
-						if shown_word.entry == known_entry:
-							word_already_known = True
-					for unknown_entry in current_session.unknown:
-						if shown_word.entry == unknown_entry:
-							word_already_unknown = True
-
-					# Remove from the unkown stack if it was troot
-					if word_already_unknown:
-						entry_in_unknown_list = [entry for entry in current_session.unknown if entry == shown_word.entry][0]
-						current_session.unknown.remove(entry_in_unknown_list)
-						current_session.known.append(shown_word.entry)
-					# Add to known only if it wasn't known already
-					elif not word_already_known:
-						current_session.known.append(shown_word.entry)
-					shown_word = WordCard(entry=current_session.sample1())
-				else:
-					hangman.step += 1
-					if hangman.step == 7:
-						hangman.draw(surface=mainsurface)
-						surface.blit(hangman.image, hangman.rect)
-						pygame.display.update()
-
-						shown_word.reveal(surface)
-						out_of_attempts_animation()
-						hangman.step = 0
-						
-						# Check if word was already known or unknown
-						word_already_unknown, word_already_known = False, False
-						for known_entry in current_session.known:
-							if shown_word.entry == known_entry:
-								word_already_known = True
-						for unknown_entry in current_session.unknown:
-							if shown_word.entry == unknown_entry:
-								word_already_unknown = True
-						# Add to unknown only if it wasn't already troot
-						if not word_already_unknown:
-							current_session.unknown.append(shown_word.entry)
-						# If it was known, remove from known and add to unknown
-						if word_already_known:
-							entry_in_known_list = [entry for entry in current_session.known if entry == shown_word.entry][0]
-							current_session.known.remove(entry_in_known_list)
-							current_session.unknown.append(shown_word.entry)
-
-						shown_word = WordCard(entry=current_session.sample1())
-
-			if help_button_rect.collidepoint((mousex, mousey)):
-				shown_word.showing_example = True
-			elif show_letter.collidepoint((mousex, mousey)):
-				shown_word.showing_letter = True
+					shown_word.reveal(surface)
+					out_of_attempts_animation()
+					engine.next()
+					scene.invalidate()
+
+			if engine.state == 'finished':
+				break
+			elif help_button_rect.collidepoint((mousex, mousey)):
+				engine.show_example()
+			elif show_letter.collidepoint((mousex, mousey)) and mouseReleased:
+				engine.reveal_letter()
 			elif skip_word.collidepoint((mousex, mousey)) and mouseReleased:
-				current_session.active_stack.append(shown_word.entry)
-				shown_word = WordCard(entry=current_session.sample1())
+				engine.skip()
 			elif show_word.collidepoint((mousex, mousey)) and mouseReleased:
 				shown_word.reveal(surface)
 				pygame.display.update()
 				time.sleep(2)
-				hangman.step = 0
-				word_already_unknown, word_already_known = False, False
-				for known_entry in current_session.known:
-					if shown_word.entry == known_entry:
-						word_already_known = True
-				for unknown_entry in current_session.unknown:
-					if shown_word.entry == unknown_entry:
-						word_already_unknown = True
-				# Add to unknown only if it wasn't already troot
-				if not word_already_unknown:
-					current_session.unknown.append(shown_word.entry)
-				# If it was known, remove from known and add to unknown
-				if word_already_known:
-					entry_in_known_list = [entry for entry in current_session.known if entry == shown_word.entry][0]
-					current_session.known.remove(entry_in_known_list)
-					current_session.unknown.append(shown_word.entry)
-				shown_word = WordCard(entry=current_session.sample1())
+				engine.give_up()
+				engine.next()
+				scene.invalidate()
 
 			elif main_menu_button.collidepoint((mousex, mousey)) and mouseReleased:
-				save_session(old_sessions, 'old_sessions.obj')
-				save_session(current_session, 'current_session.obj')
-				save_session(master_session, 'master_session.obj')
+				leave()
 				game_running = False
 
 			input_box.handle_event(event)
 
 		### Update states ----
-		if len(current_session.known) == len(current_session.stack) and \
-			len(current_session.unknown) == 0: # A bit redundant, but just to make sure
-			session_complete_animation()
-			current_session.completed = True
-			old_sessions.append(current_session)
-			current_session = master_session.sampleN_pop(50)
+		if engine.state == 'finished':
+			# Every word of the deck has been played
+			storage.save(progress)
+			surface.fill(black)
+			no_words_left_animation()
+			break
+		if shown_word.entry is not engine.entry:
+			shown_word = WordCard(entry=engine.entry)
+		shown_word.showing_example = engine.showing_example
+		shown_word.showing_letter = engine.showing_letter
+		hangman.step = engine.mistakes
 
 		input_box.update()
+		storage.checkpoint()
 
-		stack_n = main_game_font.render(str(len(current_session.unseen)), True, white)
-		stack_n_rect = stack_n.get_rect()
-		stack_n_rect.center = stack_count.center
-
-		correct_n = main_game_font.render(str(len(current_session.known)), True, green)
-		correct_n_rect = correct_n.get_rect()
-		correct_n_rect.center = correct_guesses.center
-		wrong_n = main_game_font.render(str(len(current_session.unknown)), True, red)
-		wrong_n_rect = wrong_n.get_rect()
-		wrong_n_rect.center = wrong_guesses.center
+		scene.show('card', (shown_word, shown_word.showing_example, shown_word.showing_letter))
+		scene.show('input', (input_box.color, input_box.rect.w))
+		scene.show('input_text', (input_box.text, input_box.color))
+		scene.show('hangman', hangman.step)
+		scene.show('stack', len(progress.current.unseen))
+		scene.show('correct', len(progress.current.known))
+		scene.show('wrong', len(progress.current.unknown))
 
 		# Draw
-		surface.fill(background)
-		shown_word.draw(surface=surface)
-		input_box.draw(screen=surface)
-		hangman.draw(surface=mainsurface)
-
-		pygame.draw.rect(surface, white, stack_count, 5)
-		surface.blit(stack_n, stack_n_rect)
-
-		pygame.draw.rect(surface, green, correct_guesses, 5)
-		surface.blit(correct_n, correct_n_rect)
-
-		pygame.draw.rect(surface, red, wrong_guesses, 5)
-		surface.blit(wrong_n, wrong_n_rect)
-
-		pygame.draw.rect(surface, yellow, help_button_rect, 5)
-		surface.blit(question_mark, question_rect)
-
-		surface.blit(show_letter_surf, show_letter)
-		surface.blit(show_a, show_a_rect)
-		pygame.draw.rect(surface, yellow, show_letter, 5)
-
-		surface.blit(arrow_surf, arrow_rect)
-		pygame.draw.rect(surface, blue, skip_word, 5)
-
-		surface.blit(show_word_surf, show_word)
-		pygame.draw.rect(surface, red, show_word, 5)
-
-		surface.blit(main_menu_surf, main_menu_button)
-
-		surface.blit(hangman.image, hangman.rect)
-		pygame.display.update()
-		fpsClock.tick(fps)
+		scene.draw()
+		pacer.tick()
 
 	surface.fill(black)
 
@@ -1144,7 +1210,7 @@ def run_game(surface):
 def correct_word_animation():
 	surface_alphas = list(range(0, 255, 255//15)) + [255]*15 + list(range(255, 0, -255//10))
 
-	correct_text = correct_font.render('Correct!', True, green)
+	correct_text = app.text.render(app.correct_font, 'Correct!', True, green)
 
 	box_surface = pygame.Surface(correct_text.get_size())
 	box_surface_rect = box_surface.get_rect()
@@ -1163,7 +1229,7 @@ def correct_word_animation():
 
 def out_of_attempts_animation():
 	surface_alphas = list(range(0, 255, 255//15)) + [255]*15 + list(range(255, 0, -255//10))
-	wrong_text = correct_font.render('Out of attempts!', True, red)
+	wrong_text = app.text.render(app.correct_font, 'Out of attempts!', True, red)
 
 	box_surface = pygame.Surface(wrong_text.get_size())
 	box_surface_rect = box_surface.get_rect()
@@ -1183,8 +1249,8 @@ def out_of_attempts_animation():
 
 def session_complete_animation():
 	surface_alphas = list(range(0, 255, 255//15)) + [255]*15 + list(range(255, 0, -255//10))
-	session_text = correct_font.render('Session', True, green)
-	complete_text = correct_font.render('complete!', True, green)
+	session_text = app.text.render(app.correct_font, 'Session', True, green)
+	complete_text = app.text.render(app.correct_font, 'complete!', True, green)
 
 	box_surface = pygame.Surface((complete_text.get_width(), 2.1*session_text.get_height()))
 	box_surface_rect = box_surface.get_rect()
@@ -1202,30 +1268,52 @@ def session_complete_animation():
 		pygame.display.update(box_surface_rect)
 		fpsClock.tick(fps)
 
+def no_words_left_animation():
+	"""Tell the player there is no word left to play nor due for review"""
+	surface_alphas = list(range(0, 255, 255//15)) + [255]*30 + list(range(255, 0, -255//10))
+	no_words_text = app.text.render(app.correct_font, 'No words left', True, yellow)
+	due_text = app.text.render(app.correct_font, 'or due for now', True, yellow)
+
+	box_surface = pygame.Surface((max(no_words_text.get_width(), due_text.get_width()), 
+								2.1*no_words_text.get_height()))
+	box_surface_rect = box_surface.get_rect()
+	box_surface_rect.center = screen_rect.center
+	box_surface.fill((0,0,0,0))
+
+	box_surface.blit(no_words_text, pygame.Rect((2,2),(no_words_text.get_size())))
+	box_surface.blit(due_text, pygame.Rect((2,box_surface_rect.h//2),(due_text.get_size())))
+
+	for alpha in surface_alphas:
+		mainsurface.fill(black, box_surface_rect)
+		box_surface.set_alpha(alpha)
+		mainsurface.blit(box_surface, box_surface_rect)
+		pygame.display.update(box_surface_rect)
+		fpsClock.tick(fps)
+
+
+def arrow_surface(size, pointing, width=7):
+	"""Yellow button with a black arrow pointing 'left' or 'right'"""
+	w, h = size
+	surf = pygame.Surface(size)
+	surf.fill(yellow)
+	tip = w//10 if pointing == 'left' else 9*w//10
+	pygame.draw.line(surf, black, (w//10, h//2), (9*w//10, h//2), width)
+	pygame.draw.lines(surf, black, False,
+					[(w//2, h//5), (tip, h//2), (w//2, 4*h//5)], width)
+	return surf
 
 def show_stacks(surface, nrows=4, ncols=5):
-	"""Show 4x5 grid with stack progress: 
+	"""Show stack progress one 4x5 page at a time, the newest page first: 
 		-Green stacks are complete
 		-Yellow  stacks are active
-		-Rest of grids filled with gray squares
+	Only the sessions of the page on screen get a SessionDisplay, and their
+	summaries are only read from storage when the page is shown. Arrow 
+	buttons, arrow keys and the mouse wheel turn the pages
 	"""
 
-	# Either load an unfinished session or initialize a new one
-	try:
-		current_session = load_session('current_session.obj')
-	except:
-		current_session = master_session.sampleN_pop(50)
-
-	# Try importing session history or initialize a history object
-	try:
-		old_sessions = load_session('old_sessions.obj')
-	except:
-		old_sessions = []
-
-	# If last session is completed, create a new one
-	if current_session.completed:
-		old_sessions.append(current_session)
-		current_session = master_session.sampleN_pop(50)		
+	# Continue the unfinished session, or start a new one if it is completed
+	progress, storage = app.progress, app.storage
+	progress.start()
 
 	mainsurface.fill(black)
 
@@ -1233,52 +1321,89 @@ def show_stacks(surface, nrows=4, ncols=5):
 	y_grid = [(i+1)*screen_height//nrows for i in range(nrows)]
 	x_grid = [(i+1)*screen_width//ncols for i in range(ncols)]
 	grid = [(x,y) for x in x_grid for y in y_grid]
-
-	# Gather past and present sessions
-	session_displays = pygame.sprite.Group()
-	for session in old_sessions:
-		session_displays.add(SessionDisplay(session=session))
-	session_displays.add(SessionDisplay(session=current_session))
-	all_sessions = session_displays.sprites()
-	
-	# Assign coordinates in grid to each session
-	for i in range(len(all_sessions)):
-		all_sessions[i].rect.center = grid[i]
-		
+	per_page = len(grid)
+
+	# Past sessions, then the one being played
+	n_sessions = len(progress.old_sessions) + (progress.current is not None)
+	n_pages = max(1, -(-n_sessions // per_page))
+	page = n_pages - 1
+
+	def page_displays(page):
+		start = page*per_page
+		sessions = list(progress.old_sessions[start:start+per_page])
+		if progress.current is not None and len(sessions) < per_page:
+			sessions.append(SessionSummary.of(progress.current))
+		session_displays = pygame.sprite.Group()
+		for position, session in zip(grid, sessions):
+			display = SessionDisplay(session=session)
+			display.rect.center = position
+			session_displays.add(display)
+		page_label = app.text.render(app.session_display_font, 
+			'{}/{}'.format(page+1, n_pages), True, white)
+		return session_displays, page_label
+
+	session_displays, page_label = page_displays(page)
 
 	# Display return button
 	return_button = pygame.Rect(0,0,screen_height//10,screen_height//10)
-	return_surf = pygame.Surface(return_button.size)
-	return_surf.fill(yellow)
-	pygame.draw.line(return_surf, black, (return_button.w//10, return_button.h//2),
-					(9*return_button.w//10, return_button.h//2), 7)
-	pygame.draw.lines(return_surf, black, False,
-					[(return_button.w//2, return_button.h//5),
-					(return_button.w//10, return_button.h//2),
-					(return_button.w//2, 3*return_button.h//4)], 7)
+	return_surf = arrow_surface(return_button.size, 'left')
 
+	# Page buttons
+	previous_button = pygame.Rect(screen_width-2*(screen_height//10),0,
+								screen_height//10, screen_height//20)
+	next_button = previous_button.move(previous_button.w, 0)
+	previous_surf = arrow_surface(previous_button.size, 'left', 4)
+	next_surf = arrow_surface(next_button.size, 'right', 4)
 
 	showing_stacks = True
+	redraw = True
 	while showing_stacks:
 		
-		for event in pygame.event.get():
+		new_page = page
+		for event in pacer.events():
 			if event.type == pygame.QUIT:
+				app.close()
 				pygame.quit()
 				sys.exit()
 			elif event.type == MOUSEBUTTONUP:
 				if return_button.collidepoint(event.pos):
-					save_session(current_session, 'current_session.obj')
+					storage.save(progress)
 					showing_stacks = False
-
+				elif previous_button.collidepoint(event.pos):
+					new_page = page - 1
+				elif next_button.collidepoint(event.pos):
+					new_page = page + 1
+			elif event.type == MOUSEWHEEL:
+				new_page = page - event.y
+			elif event.type == KEYDOWN:
+				if event.key in (K_LEFT, K_PAGEUP):
+					new_page = page - 1
+				elif event.key in (K_RIGHT, K_PAGEDOWN):
+					new_page = page + 1
+
+			if event.type == MOUSEBUTTONDOWN:
+				# Expanding a session draws over the whole screen
+				redraw = True
 			session_displays.update(event, surface)
 
+		new_page = min(max(new_page, 0), n_pages-1)
+		if new_page != page:
+			page = new_page
+			session_displays, page_label = page_displays(page)
+			redraw = True
 
-		surface.fill(black)
-		session_displays.draw(surface)
-		surface.blit(return_surf, return_button)
-		
-		pygame.display.update()
-		fpsClock.tick(fps)
+		if redraw and showing_stacks:
+			surface.fill(black)
+			session_displays.draw(surface)
+			surface.blit(return_surf, return_button)
+			if n_pages > 1:
+				surface.blit(previous_surf, previous_button)
+				surface.blit(next_surf, next_button)
+				surface.blit(page_label, page_label.get_rect(
+					midtop=previous_button.midbottom).move(previous_button.w//2, 5))
+			pygame.display.update()
+			redraw = False
+		pacer.tick()
 
 		if not showing_stacks:
 			surface.fill(black)
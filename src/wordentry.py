@@ -1,16 +1,42 @@
 #!/usr/bin/env python
+import hashlib
+import io
 import random
 import pickle
+import sys
+import time
+from array import array
+from collections import deque
+from sampler import WeightedSampler
+from scheduler import Scheduler
+from stats import WordStats
 
 class WordEntry():
-	"""Simple class to for a vocabulary word"""
+	"""Simple class to for a vocabulary word.
+	Entries use __slots__ and intern their short strings (word, category and 
+	difficulty), so a big deck doesn't pay for a __dict__ per entry nor for a 
+	copy of 'adjective' or 'Common' per entry"""
+	__slots__ = ('word', 'category', 'meaning', 'example', 'difficulty', 'is_known', 'id')
+
 	def __init__(self, word, category, meaning, example, difficulty, is_known=False):
-		self.word = word
-		self.category = category
+		self.word = sys.intern(word)
+		self.category = sys.intern(category)
 		self.meaning = meaning
 		self.example = example
-		self.difficulty = difficulty
+		self.difficulty = sys.intern(difficulty)
 		self.is_known = is_known
+		self.id = None # Position in the Vocabulary, set when added to one
+
+	def __reduce__(self):
+		# Pickle as a plain tuple of fields instead of an attribute dict
+		return (WordEntry, (self.word, self.category, self.meaning,
+					self.example, self.difficulty, self.is_known))
+
+	def __setstate__(self, state):
+		# Entries pickled before __slots__ were added carry their __dict__
+		if isinstance(state, tuple):
+			state = {**(state[0] or {}), **state[1]}
+		WordEntry.__init__(self, **state)
 	
 	def __repr__(self):
 		return '{w} ({c}): {m}'.format(w=self.word, c=self.category, m=self.meaning)
@@ -18,25 +44,314 @@ class WordEntry():
 	def __str__(self):
 		return '{w} ({c})\n{m}\n{e}'.format(w=self.word, c=self.category, m=self.meaning, e=self.example)
 
+	@property
+	def key(self):
+		"""Identity of an entry: two entries are the same word if they share
+		word and category"""
+		return (self.word, self.category)
+
 	def __eq__(self, other):
 		if isinstance(other, WordEntry):
-			if self.word == other.word and self.category == other.category:
-				return True
-			else:
-				return False
+			return self.key == other.key
 		else:
 			raise TypeError('Comparison has to be between two WordEntry objects')
 
+	def __hash__(self):
+		return hash(self.key)
+
+	def is_valid(self):
+		"""Whether the entry can be played: a word long enough for the 
+		hangman, with a meaning and an example to show on the card"""
+		return len(self.word) > 3 and len(self.meaning) > 5 and \
+			len(self.example.strip()) > 0
+
+class EntryStack():
+	"""List of WordEntries indexed by their key, so that membership checks and
+	removals are O(1). Removing an entry swaps it with the last one, so the 
+	order of the stack is not preserved.
+	Each entry has a weight (1 by default) kept in a WeightedSampler, and 
+	choice() draws entries in proportion to it in O(log n)"""
+	__slots__ = ('entries', 'positions', 'weights')
+
+	def __init__(self, entries=(), weights=None):
+		self.entries = []
+		self.positions = {}
+		entry_weights = []
+		weights = iter(weights) if weights is not None else None
+		for entry in entries:
+			weight = 1 if weights is None else next(weights)
+			if entry.key not in self.positions:
+				self.positions[entry.key] = len(self.entries)
+				self.entries.append(entry)
+				entry_weights.append(weight)
+		self.weights = WeightedSampler(entry_weights)
+
+	def __repr__(self):
+		return 'EntryStack({})'.format(self.entries)
+
+	def __len__(self):
+		return len(self.entries)
+
+	def __iter__(self):
+		return iter(self.entries)
+
+	def __getitem__(self, index):
+		return self.entries[index]
+
+	def __contains__(self, entry):
+		return entry.key in self.positions
+
+	def __reduce__(self):
+		if all(weight == 1 for weight in self.weights):
+			return (EntryStack, (self.entries,))
+		return (EntryStack, (self.entries, list(self.weights)))
+
+	def add(self, entry, weight=1):
+		"""Add entry if it is not in the stack yet. Returns True if it was added"""
+		if entry.key in self.positions:
+			return False
+		self.positions[entry.key] = len(self.entries)
+		self.entries.append(entry)
+		self.weights.append(weight)
+		return True
+
+	def pop(self, index=-1):
+		"""Remove and return the entry at index"""
+		entry = self.entries[index]
+		last = self.entries.pop()
+		last_weight = self.weights.pop()
+		if last is not entry:
+			position = self.positions[entry.key]
+			self.entries[position] = last
+			self.weights[position] = last_weight
+			self.positions[last.key] = position
+		del self.positions[entry.key]
+		return entry
+
+	def remove(self, entry):
+		"""Remove entry from the stack, raise KeyError if it is not in it"""
+		return self.pop(self.positions[entry.key])
+
+	def discard(self, entry):
+		"""Remove entry from the stack if present. Returns True if it was"""
+		if entry.key not in self.positions:
+			return False
+		self.pop(self.positions[entry.key])
+		return True
+
+	def copy(self):
+		copy = EntryStack()
+		copy.entries = self.entries.copy()
+		copy.positions = self.positions.copy()
+		copy.weights = self.weights.copy()
+		return copy
+
+	def weight(self, entry):
+		return self.weights[self.positions[entry.key]]
+
+	def set_weight(self, entry, weight):
+		self.weights[self.positions[entry.key]] = weight
+
+	def choice(self):
+		"""Entry drawn in proportion to its weight. Raises IndexError if the 
+		stack is empty or all weights are 0"""
+		return self.entries[self.weights.sample()]
+
+class IdPool():
+	"""Set of entry ids packed in an array of 4 bytes per id, with O(1) 
+	membership checks and removals. Like EntryStack, removing an id swaps it 
+	with the last one"""
+	__slots__ = ('ids', 'positions')
+
+	def __init__(self, ids=()):
+		self.ids = array('I', ids)
+		self.positions = {entry_id: position for position, entry_id in enumerate(self.ids)}
+		if len(self.positions) < len(self.ids):
+			# Keep the first of repeated ids
+			self.ids = array('I', self.positions)
+			self.positions = {entry_id: position for position, entry_id in enumerate(self.ids)}
+
+	def __repr__(self):
+		return 'IdPool of {} ids'.format(len(self.ids))
+
+	def __len__(self):
+		return len(self.ids)
+
+	def __iter__(self):
+		return iter(self.ids)
+
+	def __getitem__(self, index):
+		return self.ids[index]
+
+	def __contains__(self, entry_id):
+		return entry_id in self.positions
+
+	def __reduce__(self):
+		return (IdPool, (self.ids,))
+
+	def add(self, entry_id):
+		if entry_id not in self.positions:
+			self.positions[entry_id] = len(self.ids)
+			self.ids.append(entry_id)
+
+	def pop(self, index=-1):
+		"""Remove and return the id at index"""
+		entry_id = self.ids[index]
+		last = self.ids.pop()
+		if last != entry_id:
+			position = self.positions[entry_id]
+			self.ids[position] = last
+			self.positions[last] = position
+		del self.positions[entry_id]
+		return entry_id
+
+	def remove(self, entry_id):
+		"""Remove entry_id from the pool, raise KeyError if it is not in it"""
+		return self.pop(self.positions[entry_id])
+
+	def discard(self, entry_id):
+		if entry_id in self.positions:
+			self.pop(self.positions[entry_id])
+
+	def copy(self):
+		copy = IdPool()
+		copy.ids = array('I', self.ids)
+		copy.positions = self.positions.copy()
+		return copy
+
+class Vocabulary():
+	"""The deck every Session draws its entries from. Each entry gets as id its
+	position in the deck; session files store these ids instead of the entries,
+	so ids must not change once sessions have been saved against a vocabulary.
+	Entries sharing a key with an earlier one are left out.
+	Whether each entry can be played is worked out once when it is added, and
+	kept as one byte per id.
+	Files saved against a vocabulary carry its fingerprint, so that they are
+	never read against another one"""
+	__slots__ = ('entries', 'ids', 'valid', 'digest')
+
+	def __init__(self, entries=()):
+		self.entries = []
+		self.ids = {}
+		self.valid = bytearray()
+		self.digest = None
+		for entry in entries:
+			self.add(entry)
+
+	def __repr__(self):
+		return 'Vocabulary with {} entries'.format(len(self.entries))
+
+	def __len__(self):
+		return len(self.entries)
+
+	def __iter__(self):
+		return iter(self.entries)
+
+	def __getitem__(self, entry_id):
+		return self.entries[entry_id]
+
+	def __contains__(self, entry):
+		return entry.key in self.ids
+
+	def __reduce__(self):
+		return (Vocabulary, (self.entries,))
+
+	def add(self, entry):
+		"""Add entry to the deck and return the entry kept for its key"""
+		if entry.key in self.ids:
+			return self.entries[self.ids[entry.key]]
+		entry.id = len(self.entries)
+		self.ids[entry.key] = entry.id
+		self.entries.append(entry)
+		self.valid.append(entry.is_valid())
+		self.digest = None
+		return entry
+
+	def fingerprint(self):
+		"""(number of entries, hash of their keys in id order). Two 
+		vocabularies with the same fingerprint give every id the same word"""
+		if self.digest is None:
+			self.digest = key_digest(entry.key for entry in self.entries)
+		return (len(self), self.digest)
+
+	def is_valid(self, entry):
+		"""O(1) lookup of entry.is_valid() for entries of the vocabulary"""
+		return entry.id is not None and self.is_valid_id(entry.id)
+
+	def is_valid_id(self, entry_id):
+		"""Same as is_valid, by id, without looking the entry up"""
+		return entry_id < len(self.valid) and bool(self.valid[entry_id])
+
+	def difficulty(self, entry_id):
+		return self.entries[entry_id].difficulty
+
+	def canonical(self, entry):
+		"""Return the vocabulary's own copy of entry, or entry itself if the 
+		vocabulary doesn't have that word"""
+		if entry.id is not None and entry.id < len(self) and self[entry.id] is entry:
+			return entry
+		entry_id = self.ids.get(entry.key)
+		return entry if entry_id is None else self.entries[entry_id]
+
 class Session():
-	"""Class containing a collection of 50 WordCards that are either known or unkown"""
+	"""Class containing a collection of 50 WordCards that are either known or unkown.
+	Skipped and missed words go to a round queue and come back in order, 
+	requeue_gap draws later"""
+	statuses = ('known', 'unknown', 'unseen')
+	status_weights = {'known': 1, 'unknown': 2, 'unseen': 2}
+	requeue_gap = 5
+
 	def __init__(self, entries_list):
-		self.stack = [entry for entry in entries_list] 
+		self.stack = list(EntryStack(entries_list))
 		self.active_stack = self.stack.copy()
 		self.words = [entry.word for entry in self.stack]
-		self.unseen = self.stack.copy()
-		self.known = []
-		self.unknown = []
+		self.unseen = EntryStack(self.stack)
+		self.known = EntryStack()
+		self.unknown = EntryStack()
 		self.completed = False
+		self.queue = deque() # (draw it is due at, entry, weight it had)
+		self.draws = 0
+		self.completed_at = None
+
+	def __setstate__(self, state):
+		# Sessions pickled before the stacks were keyed kept plain lists
+		if not isinstance(state['unseen'], EntryStack):
+			state['stack'] = list(EntryStack(state['stack']))
+			for status in self.statuses:
+				state[status] = EntryStack(state[status])
+		# Sessions pickled before the round queue sent skipped words to active_stack
+		state.setdefault('queue', deque())
+		state.setdefault('draws', 0)
+		state.setdefault('completed_at', None)
+		# Master sessions drew from an index of active_stack (see MasterSession)
+		state.pop('difficulty_pools', None)
+		self.__dict__.update(state)
+
+	def attach(self, vocabulary):
+		"""Replace the entries of every stack by the vocabulary's own copies, so 
+		that all sessions share a single object per word"""
+		canonical = vocabulary.canonical
+		self.stack = [canonical(entry) for entry in self.stack]
+		self.active_stack = [canonical(entry) for entry in self.active_stack]
+		for status in self.statuses:
+			stack = getattr(self, status)
+			setattr(self, status, EntryStack(
+				(canonical(entry) for entry in stack), stack.weights))
+		self.queue = deque((due, canonical(entry), weight) 
+							for due, entry, weight in self.queue)
+
+	def snapshot(self):
+		"""Copy of the session that can be saved while this one keeps changing.
+		Entries are shared, only the stacks are copied"""
+		copy = Session.__new__(Session)
+		copy.__dict__.update(self.__dict__)
+		copy.stack = self.stack.copy()
+		copy.active_stack = self.active_stack.copy()
+		copy.words = self.words.copy()
+		copy.queue = self.queue.copy()
+		for status in self.statuses:
+			setattr(copy, status, getattr(self, status).copy())
+		return copy
 
 	def __repr__(self):
 		return (
@@ -55,47 +370,614 @@ class Session():
 	def __len__(self):
 		return len(self.stack)
 
+	def status(self, entry):
+		"""Return whether entry is 'known', 'unknown', 'unseen' or None if 
+		it is in none of these stacks"""
+		for status in self.statuses:
+			if entry in getattr(self, status):
+				return status
+		return None
+
+	def move(self, entry, status, weight=None):
+		"""Put entry in the known, unknown or unseen stack, taking it out of 
+		whichever other one it was in. It gets weight if given, else keeps the
+		weight it had (1 for a word in no stack). A word waiting in the round 
+		queue keeps weight 0 until it comes back"""
+		if status not in self.statuses:
+			raise ValueError('Unknown status {}'.format(status))
+		kept = 1
+		for other in self.statuses:
+			if other != status and entry in getattr(self, other):
+				kept = getattr(self, other).weight(entry)
+				getattr(self, other).discard(entry)
+		if weight is None or kept == 0:
+			weight = kept
+		getattr(self, status).add(entry, weight)
+
+	def discard(self, entry):
+		"""Take entry out of the session altogether"""
+		for status in self.statuses:
+			getattr(self, status).discard(entry)
+		self.stack = [e for e in self.stack if e.key != entry.key]
+		self.active_stack = [e for e in self.active_stack if e.key != entry.key]
+		self.words = [e.word for e in self.stack]
+		self.queue = deque(item for item in self.queue if item[1].key != entry.key)
+
+	def set_weight(self, entry, weight):
+		"""Make entry more (weight > 1) or less (weight < 1) likely to be drawn
+		than the other entries of its stack"""
+		getattr(self, self.status(entry)).set_weight(entry, weight)
+
+	def mark_known(self, entry, weight=None):
+		self.move(entry, 'known', weight)
+
+	def mark_unknown(self, entry, weight=None):
+		self.move(entry, 'unknown', weight)
+
+	def defer(self, entry, gap=None):
+		"""Put entry at the back of the round queue, in O(1). It is left out of
+		random draws until it comes back, gap draws from now at the earliest
+		and after the words queued before it"""
+		gap = self.requeue_gap if gap is None else gap
+		self.queue.append((self.draws + gap, entry, self.hold(entry)))
+
+	def put_first(self, entry):
+		"""Put entry at the front of the round queue, to be the next draw"""
+		self.queue.appendleft((self.draws, entry, self.hold(entry)))
+
+	def hold(self, entry):
+		"""Leave a word to be queued out of random draws. Returns the weight 
+		it gets back once dequeued"""
+		status = self.status(entry)
+		if status is None:
+			return 1
+		stack = getattr(self, status)
+		weight = stack.weight(entry)
+		stack.set_weight(entry, 0)
+		return weight
+
+	def peek_next(self):
+		"""Word the next draw will take from the round queue, or None if the 
+		next draw is random"""
+		if self.queue and self.queue[0][0] <= self.draws + 1:
+			return self.queue[0][1]
+		return None
+
+	def next_queued(self):
+		_, entry, weight = self.queue.popleft()
+		status = self.status(entry)
+		if status is not None:
+			getattr(self, status).set_weight(entry, weight)
+		return entry
+
+	def recover(self):
+		"""Queue the words that were drawn but never answered, e.g. the card on
+		screen when the game was closed, so that they are not lost. Returns 
+		them"""
+		queued = {entry.key for _, entry, _ in self.queue}
+		recovered = [entry for entry in self.stack 
+					if entry.key not in queued and self.status(entry) is None]
+		for entry in recovered:
+			self.defer(entry, gap=0)
+		return recovered
+
+	def is_complete(self):
+		"""All words have been guessed and none is left to learn"""
+		return len(self.known) == len(self.stack) and len(self.unknown) == 0
+
 	def sample1(self):
 		"""Sample 1 word out the stack. Depending on the word status, it has 
-		a different chance of apprearing, namely:
+		a different chance of apprearing, set by status_weights (only stacks 
+		with words count), namely:
 		- Known word: 20%
 		- Unseen word: 40%
-		- Unknown word: 40%"""
-		#choice = self.active_stack.keys()[random.choice(range(len(self.active_stack)))]
-		len_k = 1 if len(self.known)>0 else 0
-		len_uk = 1 if len(self.unknown)>0 else 0
-		len_us = 1 if len(self.unseen)>0 else 0
-		set_to_choose = random.choice(len_k*['known'] + \
-				2*len_uk*['unknown'] + 2*len_us*['unseen'])
-		if set_to_choose == 'known':
-			return self.known[random.choice(range(len(self.known)))]
-		elif set_to_choose == 'unknown':
-			return self.unknown[random.choice(range(len(self.unknown)))]
-		elif set_to_choose == 'unseen':
-			return self.unseen.pop(random.choice(range(len(self.unseen))))
-		else:
-			return self.sample1()
+		- Unknown word: 40%
+		Within a stack, words are drawn in proportion to their weight (see 
+		set_weight) in O(log n). Unseen words are taken out of their stack.
+		Words of the round queue come first once they are due (see defer).
+		Raises IndexError if there is no word left to draw"""
+		if self.peek_next() is not None:
+			self.draws += 1
+			return self.next_queued()
+		self.draws += 1
+		total = 0
+		for status, weight in self.status_weights.items():
+			if getattr(self, status).weights.total > 0:
+				total += weight
+		if total == 0:
+			if self.queue:
+				return self.next_queued()
+			raise IndexError('No words left to sample')
+		target = random.random() * total
+		for status, weight in self.status_weights.items():
+			stack = getattr(self, status)
+			if stack.weights.total > 0:
+				chosen = status
+				if target < weight:
+					break
+				target -= weight
+		stack = getattr(self, chosen)
+		entry = stack.choice()
+		if chosen == 'unseen':
+			stack.remove(entry)
+		return entry
+
+class MasterSession():
+	"""The words no session has used yet, kept as their ids in an IdPool. 
+	Entries are only looked up in the vocabulary once drawn into a session, 
+	so that a deck file (see deckfile) only decodes the cards played.
+	Older saves kept a whole Session of entries instead (see GameProgress)"""
+	def __init__(self, ids=(), vocabulary=None):
+		self.active_stack = IdPool(ids)
+		self.vocabulary = vocabulary # Set by GameProgress, not saved
+		self.difficulty_pools = None
+
+	@classmethod
+	def of(cls, session, vocabulary):
+		"""MasterSession with the unused words of a master Session"""
+		return cls((entry.id for entry in session.active_stack if entry.id is not None), 
+					vocabulary)
+
+	def __reduce__(self):
+		return (MasterSession, (self.active_stack.ids,))
+
+	def __repr__(self):
+		return 'Master session with {} unused words'.format(len(self.active_stack))
+
+	def __len__(self):
+		return len(self.active_stack)
+
+	def snapshot(self):
+		copy = MasterSession(vocabulary=self.vocabulary)
+		copy.active_stack = self.active_stack.copy()
+		return copy
+
+	def keep(self, predicate):
+		"""Drop the unused words whose id doesn't satisfy predicate"""
+		dropped = [entry_id for entry_id in self.active_stack if not predicate(entry_id)]
+		for entry_id in dropped:
+			self.active_stack.remove(entry_id)
+		if dropped:
+			self.difficulty_pools = None
+
+	def pools(self):
+		"""Unused words by difficulty, as {difficulty: IdPool}, indexed once. 
+		Only the difficulty field of each word is read"""
+		if self.difficulty_pools is None:
+			self.difficulty_pools = {}
+			difficulty = self.vocabulary.difficulty
+			for entry_id in self.active_stack:
+				self.difficulty_pools.setdefault(difficulty(entry_id), IdPool()).add(entry_id)
+		return self.difficulty_pools
 
 	def sampleN_pop(self, n):
-		""" Only meant for Master session. Sample n words out of the stack of 
-		words that have not been used yet"""
-		#choices = self.active_stack.keys()[random.sample(range(len(self.active_stack)), n)]
-		choices = random.sample(range(len(self.active_stack)), n)
-		stack_to_pop = [self.active_stack[choice] for choice in choices]
-		self.active_stack = [entry for entry in self.active_stack if entry not in stack_to_pop]
+		"""Sample n words out of the unused ones, as a new Session. Costs O(n)
+		no matter how big the master deck is"""
+		if not 0 <= n <= len(self.active_stack):
+			raise ValueError('Sample larger than population or is negative')
+		stack_to_pop = []
+		for _ in range(n):
+			entry_id = self.active_stack.pop(random.randrange(len(self.active_stack)))
+			if self.difficulty_pools is not None:
+				self.difficulty_pools[self.vocabulary.difficulty(entry_id)].remove(entry_id)
+			stack_to_pop.append(self.vocabulary[entry_id])
 		return Session(stack_to_pop)
 
+	def sample_mix(self, mix):
+		"""Same as sampleN_pop, taking as many words of each difficulty as 
+		given by mix, e.g. {'Common': 30, 'Basic': 15, 'Advanced': 5}. Costs 
+		O(k) for k words once the pools are indexed"""
+		pools = self.pools()
+		for difficulty, n in mix.items():
+			if not 0 <= n <= len(pools.get(difficulty, ())):
+				raise ValueError('Not {} {} words left to sample'.format(n, difficulty))
+		stack_to_pop = []
+		for difficulty, n in mix.items():
+			pool = pools.get(difficulty)
+			for _ in range(n):
+				entry_id = pool.pop(random.randrange(len(pool)))
+				self.active_stack.remove(entry_id)
+				stack_to_pop.append(self.vocabulary[entry_id])
+		return Session(stack_to_pop)
+
+	def take(self, entries):
+		"""Take the given entries out of the unused words and return them as a
+		new Session"""
+		for entry in entries:
+			self.active_stack.discard(entry.id)
+			if self.difficulty_pools is not None:
+				pool = self.difficulty_pools.get(entry.difficulty)
+				if pool is not None:
+					pool.discard(entry.id)
+		return Session(entries)
+
+class SessionSummary():
+	"""What is kept of a completed session: completion time and the ids of 
+	its entries, all of them and the known and unknown ones, packed in arrays
+	of 4 bytes per id. Counts are the lengths of these arrays; entries are only
+	looked up in the vocabulary when the session is expanded in the gallery"""
+	__slots__ = ('stack', 'known', 'unknown', 'queued', 'completed', 'completed_at')
+
+	def __init__(self, stack=(), known=(), unknown=(), queued=0, completed=True, 
+				completed_at=None):
+		self.stack = array('I', stack)
+		self.known = array('I', known)
+		self.unknown = array('I', unknown)
+		self.queued = queued
+		self.completed = completed
+		self.completed_at = completed_at
+
+	@classmethod
+	def of(cls, session):
+		"""Summary of a Session. Entries that are not in a vocabulary, and so
+		have no id, are left out"""
+		if isinstance(session, SessionSummary):
+			return session
+		ids = lambda stack: (entry.id for entry in stack if entry.id is not None)
+		return cls(ids(session.stack), ids(session.known), ids(session.unknown),
+				len(getattr(session, 'queue', ())), session.completed,
+				getattr(session, 'completed_at', None))
+
+	def __repr__(self):
+		return 'Known: {k}\tUnknown: {u}'.format(k=len(self.known), u=len(self.unknown))
+
+	def __len__(self):
+		return len(self.stack)
+
+	def __reduce__(self):
+		return (SessionSummary, (self.stack, self.known, self.unknown, self.queued,
+								self.completed, self.completed_at))
+
+	def entries(self, vocabulary):
+		"""Entries of the session, in order"""
+		return [vocabulary[entry_id] for entry_id in self.stack]
+
+	def status(self, entry_id):
+		"""Same as Session.status, by entry id"""
+		if entry_id in self.known:
+			return 'known'
+		elif entry_id in self.unknown:
+			return 'unknown'
+		return None
+
+class GameProgress():
+	"""Everything a player has done: the master session holding the words not
+	played yet, the session being played, the completed ones, and the review
+	schedule and stats of the words already played.
+	The game changes them only through these methods, which report each change
+	as journal(op, *args) so that a storage can save it incrementally.
+	Completed sessions are archived as SessionSummary records"""
+	session_size = 50
+	# Difficulties of the new words of a session, e.g. {'Common': 30, 
+	# 'Basic': 15, 'Advanced': 5}. None draws them regardless of difficulty
+	session_mix = None
+	# Answer quality given to the scheduler, from 0 (no idea) to 5 (perfect)
+	known_quality = 4
+	unknown_quality = 1
+	reveal_quality = 0
+	# Time of reviews, replaced by simulations to play days in seconds
+	clock = staticmethod(time.time)
+
+	def __init__(self, master, current=None, old_sessions=None, scheduler=None,
+				vocabulary=None, stats=None):
+		if vocabulary is not None:
+			if not isinstance(master, MasterSession):
+				# Older saves kept the unused words as a Session of entries
+				master = MasterSession.of(master, vocabulary)
+			master.vocabulary = vocabulary
+		self.master = master
+		self.current = current
+		self.old_sessions = [] if old_sessions is None else old_sessions
+		if isinstance(self.old_sessions, list):
+			# Older saves archived whole sessions
+			self.old_sessions[:] = [SessionSummary.of(s) for s in self.old_sessions]
+		self.scheduler = Scheduler() if scheduler is None else scheduler
+		self.stats = WordStats() if stats is None else stats
+		self.vocabulary = vocabulary # To find the words due for review
+		self.journal = None
+		if vocabulary is not None:
+			self.drop_invalid()
+
+	def record(self, op, *args):
+		if self.journal is not None:
+			self.journal(op, *args)
 
-def load_session(path):
-	"""Wrapper for pickle.load()"""
+	def resume(self):
+		"""Put back the words drawn but never answered in the session being
+		played (see Session.recover). Storages call it once the progress is 
+		completely loaded, journal included"""
+		if self.current is not None:
+			for entry in self.current.recover():
+				self.record('defer', entry.id)
+
+	def drop_invalid(self):
+		"""Keep words that can't be played out of the unused words and of the 
+		session being played, so every draw gives a playable card. Progress 
+		saved before the validity index may still have some"""
+		is_valid = self.vocabulary.is_valid
+		self.master.keep(self.vocabulary.is_valid_id)
+		if self.current is not None:
+			for entry in [entry for entry in self.current.stack if not is_valid(entry)]:
+				self.current.discard(entry)
+
+	def snapshot(self):
+		"""Copy of the progress that can be saved in the background. Archived
+		sessions don't change anymore, so they are shared"""
+		copy = GameProgress(self.master.snapshot(),
+			None if self.current is None else self.current.snapshot(),
+			list(self.old_sessions), self.scheduler.copy(), stats=self.stats.copy())
+		copy.vocabulary = self.vocabulary
+		return copy
+
+	def start(self):
+		"""Make sure there is a session to play, replacing a completed one. 
+		There is none if no word is left to play nor due for review"""
+		if self.current is not None and len(self.current) == 0:
+			# Older saves started empty sessions once the master ran out
+			self.current = None
+		if self.current is not None and not self.current.completed and \
+			self.current.is_complete():
+			# The game was left before the last card of the session
+			self.complete_session()
+			return
+		if self.current is not None and self.current.completed:
+			self.old_sessions.append(SessionSummary.of(self.current))
+			self.record('archive')
+			self.current = None
+		if self.current is None:
+			self.new_session()
+
+	def new_session(self, now=None):
+		"""Session made of the words due for review, most overdue first, 
+		topped up with words never played. Leaves current to None if there is
+		no word for it"""
+		now = self.clock() if now is None else now
+		due = []
+		if self.vocabulary is not None:
+			due = [self.vocabulary[i] for i in self.scheduler.pop_due(self.session_size, now)]
+		n = min(self.session_size - len(due), len(self.master.active_stack))
+		if self.session_mix:
+			new = self.master.sample_mix(self.mix_for(n))
+		else:
+			new = self.master.sampleN_pop(n)
+		if not due and not new.stack:
+			self.current = None
+			return
+		self.current = Session(due + new.stack)
+		self.weigh(self.current)
+		self.record('new_session', [entry.id for entry in self.current.stack])
+
+	def mix_for(self, n):
+		"""session_mix scaled to n new words. When a difficulty runs out, the
+		words missing are taken from the other ones, those in the mix first"""
+		pools = self.master.pools()
+		total = sum(self.session_mix.values())
+		mix = {difficulty: min(count*n // total, len(pools.get(difficulty, ())))
+				for difficulty, count in self.session_mix.items()}
+		missing = n - sum(mix.values())
+		others = [difficulty for difficulty in pools if difficulty not in mix]
+		for difficulty in list(mix) + others:
+			extra = min(missing, len(pools[difficulty]) - mix.get(difficulty, 0)) \
+				if difficulty in pools else 0
+			mix[difficulty] = mix.get(difficulty, 0) + extra
+			missing -= extra
+		return mix
+
+	def weigh(self, session):
+		"""Words that lapsed more often are drawn more often"""
+		for entry in session.stack:
+			weight = self.scheduler.weight(entry.id)
+			if weight != 1:
+				session.set_weight(entry, weight)
+
+	def complete_session(self):
+		self.current.completed = True
+		self.current.completed_at = self.clock()
+		self.record('complete', self.current.completed_at)
+		self.start()
+
+	def draw(self):
+		"""Sample a word from the current session. Raises IndexError if there
+		is none"""
+		if self.current is None:
+			raise IndexError('No session to play')
+		n_unseen = len(self.current.unseen)
+		n_queued = len(self.current.queue)
+		entry = self.current.sample1()
+		# Every draw is recorded, so that replaying the journal gives the same
+		# round queue and the same count of draws the queue is due at
+		if len(self.current.unseen) < n_unseen:
+			self.record('draw', entry.id)
+		elif len(self.current.queue) < n_queued:
+			self.record('dequeue', entry.id)
+		else:
+			self.record('redraw', entry.id)
+		return entry
+
+	def put_back(self, entry):
+		"""Queue a word that was drawn but not answered, to be the next draw"""
+		self.current.put_first(entry)
+		self.record('put_back', entry.id)
+
+	def review(self, op, entry, quality):
+		"""Count an answer in the stats and the schedule of the word"""
+		now = self.clock()
+		self.stats.update(op, entry.id, now)
+		self.scheduler.review(entry.id, quality, now)
+		self.record(op, entry.id, quality, now)
+
+	# Answers are reviewed first, so that the word is weighed with the lapse
+	# it may have just counted (see weigh)
+	def mark_known(self, entry, quality=None):
+		quality = self.known_quality if quality is None else quality
+		self.review('known', entry, quality)
+		self.current.mark_known(entry, self.scheduler.weight(entry.id))
+
+	def mark_unknown(self, entry, quality=None):
+		quality = self.unknown_quality if quality is None else quality
+		self.review('unknown', entry, quality)
+		self.current.mark_unknown(entry, self.scheduler.weight(entry.id))
+		self.current.defer(entry)
+
+	def reveal(self, entry):
+		"""Player gave up on the word: same as not guessing it"""
+		self.review('reveal', entry, self.reveal_quality)
+		self.current.mark_unknown(entry, self.scheduler.weight(entry.id))
+		self.current.defer(entry)
+
+	def skip(self, entry):
+		self.current.defer(entry)
+		now = self.clock()
+		self.stats.update('skip', entry.id, now)
+		self.record('skip', entry.id, now)
+
+	def hint(self, entry):
+		"""Player asked for a letter or the example of the word"""
+		now = self.clock()
+		self.stats.update('hint', entry.id, now)
+		self.record('hint', entry.id, now)
+
+	def apply(self, vocabulary, op, *args):
+		"""Redo a change reported to the journal, with entries given as ids"""
+		# Answers are reviewed first, as when they were given. Older journals 
+		# didn't record reviews with their quality and time
+		if op in ('known', 'unknown', 'reveal') and len(args) == 3:
+			self.scheduler.review(*args)
+		if op == 'new_session':
+			for i in args[0]:
+				self.scheduler.hold(i)
+			self.current = self.master.take([vocabulary[i] for i in args[0]])
+			self.weigh(self.current)
+		elif op == 'complete':
+			self.current.completed = True
+			self.current.completed_at = args[0] if args else None
+		elif op == 'archive':
+			self.old_sessions.append(SessionSummary.of(self.current))
+			self.current = None
+		elif op == 'draw':
+			self.current.draws += 1
+			self.current.unseen.discard(vocabulary[args[0]])
+		elif op == 'dequeue':
+			self.current.draws += 1
+			self.current.next_queued()
+		elif op == 'redraw':
+			self.current.draws += 1
+		elif op == 'defer':
+			self.current.defer(vocabulary[args[0]], gap=0)
+		elif op == 'put_back':
+			self.current.put_first(vocabulary[args[0]])
+		elif op == 'known':
+			self.current.mark_known(vocabulary[args[0]], self.scheduler.weight(args[0]))
+		elif op in ('unknown', 'reveal'):
+			self.current.mark_unknown(vocabulary[args[0]], self.scheduler.weight(args[0]))
+			self.current.defer(vocabulary[args[0]])
+		elif op == 'skip':
+			self.current.defer(vocabulary[args[0]])
+		elif op != 'hint':
+			raise ValueError('Unknown journal operation {}'.format(op))
+		# ... nor skips and hints with their time
+		if op in ('known', 'unknown', 'reveal', 'skip', 'hint') and len(args) > 1:
+			self.stats.update(op, args[0], args[-1])
+
+
+class VocabularyMismatch(ValueError):
+	"""A file was saved against another vocabulary than the one it is read with"""
+
+def key_digest(keys):
+	"""Hash of a sequence of entry keys, the same in every run"""
+	digest = hashlib.sha1()
+	for word, category in keys:
+		digest.update('{}\t{}\n'.format(word, category).encode('utf-8'))
+	return digest.hexdigest()
+
+# First object of the files saved against a vocabulary, followed by its 
+# fingerprint
+fingerprint_tag = 'vocabulary fingerprint'
+
+def check_fingerprint(fingerprint, vocabulary, source='File'):
+	"""Raise VocabularyMismatch if fingerprint is not the one of vocabulary"""
+	if tuple(fingerprint) != vocabulary.fingerprint():
+		raise VocabularyMismatch(
+			'{} was saved against a vocabulary of {} entries that is not the '
+			'current one ({} entries). Its ids would point to other words'
+			.format(source, fingerprint[0], len(vocabulary)))
+
+class VocabularyPickler(pickle.Pickler):
+	"""Pickler that writes entries of the vocabulary as their id only. The
+	fingerprint of the vocabulary goes first (see dump)"""
+	def __init__(self, file, vocabulary=None):
+		super().__init__(file)
+		self.vocabulary = vocabulary
+
+	def dump(self, obj):
+		if self.vocabulary is not None:
+			super().dump((fingerprint_tag, *self.vocabulary.fingerprint()))
+		super().dump(obj)
+
+	def persistent_id(self, obj):
+		if self.vocabulary is not None and isinstance(obj, WordEntry) and \
+			obj.id is not None and obj.id < len(self.vocabulary) and \
+			self.vocabulary[obj.id] is obj:
+			return obj.id
+		return None
+
+class VocabularyUnpickler(pickle.Unpickler):
+	"""Unpickler that hydrates entry ids with the entries of the vocabulary.
+	Raises VocabularyMismatch if the file was saved against another one"""
+	def __init__(self, file, vocabulary=None):
+		super().__init__(file)
+		self.vocabulary = vocabulary
+
+	def load(self):
+		obj = super().load()
+		if isinstance(obj, tuple) and len(obj) == 3 and obj[0] == fingerprint_tag:
+			if self.vocabulary is not None:
+				check_fingerprint(obj[1:], self.vocabulary, 
+					getattr(self, 'name', 'File'))
+			obj = super().load()
+		return obj
+
+	def persistent_load(self, pid):
+		if self.vocabulary is None:
+			raise pickle.UnpicklingError(
+				'File refers to vocabulary entries, load it with a vocabulary')
+		return self.vocabulary[pid]
+
+def load_vocabulary(path):
+	"""Load a Vocabulary. Older vocabulary files, pickled as a dict or a 
+	pandas Series of WordEntries, are converted"""
+	vocabulary = load_session(path)
+	if isinstance(vocabulary, Vocabulary):
+		return vocabulary
+	elif isinstance(vocabulary, dict):
+		return Vocabulary(vocabulary.values())
+	else:
+		return Vocabulary(vocabulary)
+
+def load_session(path, vocabulary=None):
+	"""Wrapper for pickle.load(). If a vocabulary is given, entries saved as 
+	ids are looked up in it and the loaded sessions are attached to it"""
 	with open(path, 'rb') as p:
-		session = pickle.load(p)
+		unpickler = VocabularyUnpickler(p, vocabulary)
+		unpickler.name = str(path)
+		session = unpickler.load()
+	if vocabulary is not None:
+		for s in (session if isinstance(session, list) else [session]):
+			if isinstance(s, Session):
+				s.attach(vocabulary)
 	return session
 
-def save_session(obj, filename):
-	"""Wrapper for pickle.dump()"""
+def dumps_session(obj, vocabulary=None):
+	"""Same as save_session, returning the pickle as bytes"""
+	buffer = io.BytesIO()
+	VocabularyPickler(buffer, vocabulary).dump(obj)
+	return buffer.getvalue()
+
+def save_session(obj, filename, vocabulary=None):
+	"""Wrapper for pickle.dump(). If a vocabulary is given, its entries are 
+	stored as ids so the file only grows a few bytes per card"""
 	with open(filename, 'wb') as p:
-		session = pickle.dump(obj, p)
+		VocabularyPickler(p, vocabulary).dump(obj)
 	return None
 
 
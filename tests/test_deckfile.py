@@ -0,0 +1,32 @@
+import pytest
+from deckfile import MappedVocabulary, write_deck
+from wordentry import *
+
+def make_vocabulary(n=20, prefix='word'):
+	return Vocabulary(WordEntry('{}{}'.format(prefix, i), 'noun', 'meaning of word {}'.format(i),
+		'an example with {}{}'.format(prefix, i), 'Common') for i in range(n))
+
+def test_deck_round_trip(tmp_path):
+	vocabulary = make_vocabulary()
+	vocabulary.add(WordEntry('ñu', 'noun', 'short', '', 'Basic'))
+	write_deck(vocabulary, tmp_path / 'vocabulary.deck')
+	deck = MappedVocabulary(tmp_path / 'vocabulary.deck')
+	assert len(deck) == len(vocabulary)
+	for entry_id, entry in enumerate(vocabulary):
+		mapped = deck[entry_id]
+		assert mapped.id == entry_id
+		assert (mapped.word, mapped.category, mapped.meaning, mapped.example, 
+				mapped.difficulty) == (entry.word, entry.category, entry.meaning, 
+				entry.example, entry.difficulty)
+		assert deck.is_valid_id(entry_id) == entry.is_valid()
+	assert deck.fingerprint() == vocabulary.fingerprint()
+
+def test_saved_ids_need_the_same_deck(tmp_path):
+	write_deck(make_vocabulary(), tmp_path / 'vocabulary.deck')
+	write_deck(make_vocabulary(prefix='other'), tmp_path / 'other.deck')
+	deck = MappedVocabulary(tmp_path / 'vocabulary.deck')
+	save_session(MasterSession(range(len(deck))), tmp_path / 'master_session.obj', deck)
+	assert len(load_session(tmp_path / 'master_session.obj', deck)) == len(deck)
+	# Same size, other words: the ids would point to other words
+	with pytest.raises(VocabularyMismatch):
+		load_session(tmp_path / 'master_session.obj', MappedVocabulary(tmp_path / 'other.deck'))
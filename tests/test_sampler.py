@@ -0,0 +1,55 @@
+import random
+import pytest
+from sampler import WeightedSampler
+
+def test_empty_sampler_raises():
+	sampler = WeightedSampler()
+	assert sampler.total == 0
+	with pytest.raises(IndexError):
+		sampler.sample()
+
+def test_float_weights_down_to_zero():
+	sampler = WeightedSampler([0.1, 0.2, 0.7])
+	for i in range(3):
+		sampler[i] = 0
+	# Rounding left in the tree doesn't count as weight
+	assert sampler.total == 0
+	with pytest.raises(IndexError):
+		sampler.sample()
+
+def test_many_updates_match_the_weights():
+	rng = random.Random(0)
+	sampler = WeightedSampler()
+	weights = []
+	for _ in range(5000):
+		if weights and rng.random() < 0.3:
+			if rng.random() < 0.5:
+				assert sampler.pop() == weights.pop()
+			else:
+				i = rng.randrange(len(weights))
+				weights[i] = sampler[i] = rng.choice([0, rng.random(), rng.randint(1, 5)])
+		else:
+			weight = rng.choice([0, rng.random()])
+			weights.append(weight)
+			sampler.append(weight)
+		assert sampler.total == pytest.approx(sum(weights))
+		if any(weights):
+			assert weights[sampler.sample(rng)] > 0
+		else:
+			with pytest.raises(IndexError):
+				sampler.sample(rng)
+	# Then every weight back to zero
+	for i in range(len(weights)):
+		sampler[i] = 0
+	assert sampler.total == 0
+	with pytest.raises(IndexError):
+		sampler.sample(rng)
+
+def test_sample_follows_the_weights():
+	rng = random.Random(1)
+	sampler = WeightedSampler([1, 0, 3])
+	counts = [0, 0, 0]
+	for _ in range(4000):
+		counts[sampler.sample(rng)] += 1
+	assert counts[1] == 0
+	assert 2.5 < counts[2] / counts[0] < 3.5
@@ -0,0 +1,32 @@
+from scheduler import Scheduler, day
+
+def test_pop_due_gives_most_overdue_first():
+	scheduler = Scheduler()
+	# Lapses come back one day after the review
+	for entry_id, now in [(1, 30), (2, 10), (3, 20), (4, 5*day)]:
+		scheduler.review(entry_id, 0, now)
+	now = 2*day
+	assert scheduler.next_card(now) == 2
+	assert scheduler.pop_due(10, now) == [2, 3, 1]
+	assert scheduler.next_card(now) is None
+
+def test_held_words_come_back_when_reviewed():
+	scheduler = Scheduler()
+	scheduler.review(1, 0, 0)
+	scheduler.review(2, 0, 10)
+	scheduler.hold(1)
+	assert scheduler.pop_due(10, 2*day) == [2]
+	# Reviewed again: back in the heap at its new due time
+	scheduler.review(1, 5, 2*day)
+	assert scheduler.next_card(2*day) is None
+	assert scheduler.next_card(4*day) == 1
+
+def test_reload_keeps_held_words_out():
+	scheduler = Scheduler()
+	for entry_id in range(5):
+		scheduler.review(entry_id, 0, entry_id)
+	scheduler.pop_due(2, 2*day)
+	copy = scheduler.copy()
+	assert copy.pop_due(10, 2*day) == [2, 3, 4]
+	assert copy.weight(0) == 2
+	assert copy.weight(9) == 1
@@ -0,0 +1,17 @@
+import pytest
+np = pytest.importorskip('numpy')
+from simulation import simulate
+
+def test_no_mastery_is_reported_as_na():
+	report = simulate(['Advanced']*200, 'game', learners=20, sessions=2, mastery=0.99, seed=0)
+	assert report.sessions_to_mastery is None
+	assert 'n/a sessions to mastery' in repr(report)
+
+def test_reviews_master_the_first_words_later():
+	# Without reviews the words of the first session only come back once the
+	# deck runs out of new words
+	deck = ['Common', 'Basic', 'Advanced']*100
+	game = simulate(deck, 'game', learners=200, sessions=10, seed=0)
+	reviews = simulate(deck, 'reviews', learners=200, sessions=10, seed=0)
+	assert reviews.sessions_to_mastery > 1
+	assert reviews.reached_mastery > game.reached_mastery
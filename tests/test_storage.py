@@ -0,0 +1,146 @@
+import random
+import pytest
+from engine import GameEngine
+from storage import open_storage
+from wordentry import *
+
+def make_vocabulary(n=200):
+	return Vocabulary(WordEntry('word{}'.format(i), 'noun', 'meaning of word {}'.format(i),
+		'an example with word{}'.format(i), 'Common') for i in range(n))
+
+def open_progress(kind, directory, vocabulary):
+	storage = open_storage(kind, directory, vocabulary)
+	return storage, storage.load()
+
+def state(progress):
+	"""Everything about the session being played that a reload must keep"""
+	session = progress.current
+	return {
+		'queue': [(due - session.draws, entry.id, weight) for due, entry, weight in session.queue],
+		'stacks': {status: sorted((entry.id, getattr(session, status).weight(entry)) 
+					for entry in getattr(session, status)) for status in session.statuses},
+		'schedule': {entry_id: repr(s) for entry_id, s in progress.scheduler.states.items()},
+		'stats': {entry_id: list(counts) for entry_id, counts in progress.stats.counters.items()},
+	}
+
+def play_rounds(engine, rounds, rng, missed):
+	"""Miss the first card dealt twice, then answer, miss or skip at random"""
+	target = engine.entry
+	for _ in range(rounds):
+		if engine.state in ('solved', 'failed', 'complete'):
+			engine.next()
+		if engine.state != 'guessing':
+			break
+		if engine.entry is target and missed[0] < 2:
+			missed[0] += 1
+			engine.give_up()
+		elif rng.random() < 0.2:
+			engine.skip()
+		elif rng.random() < 0.7:
+			engine.submit_guess(engine.entry.word)
+		else:
+			engine.give_up()
+
+@pytest.fixture
+def deck(tmp_path):
+	vocabulary = make_vocabulary()
+	save_session(MasterSession(range(len(vocabulary))), tmp_path / 'master_session.obj', 
+				vocabulary)
+	return tmp_path, vocabulary
+
+@pytest.mark.parametrize('kind', ['journal', 'pickle', 'sqlite'])
+def test_reload_keeps_round_queue(deck, kind):
+	directory, vocabulary = deck
+	rng = random.Random(4)
+	random.seed(4)
+	missed = [0]
+	storage, progress = open_progress(kind, directory, vocabulary)
+	for _ in range(3):
+		engine = GameEngine(progress)
+		play_rounds(engine, 30, rng, missed)
+		# Leaving the game screen puts the card on screen back
+		if engine.state == 'guessing':
+			progress.put_back(engine.entry)
+		elif engine.state != 'finished':
+			engine.next()
+			progress.put_back(engine.entry)
+		before = state(progress)
+		storage.save(progress)
+		storage.close()
+		storage, progress = open_progress(kind, directory, vocabulary)
+		assert state(progress) == before
+	assert missed[0] == 2
+	storage.close()
+
+@pytest.mark.parametrize('kind', ['journal', 'pickle', 'sqlite'])
+def test_card_on_screen_comes_back(deck, kind):
+	directory, vocabulary = deck
+	random.seed(7)
+	storage, progress = open_progress(kind, directory, vocabulary)
+	engine = GameEngine(progress)
+	play_rounds(engine, 20, random.Random(7), [0])
+	if engine.state != 'guessing':
+		engine.next()
+	# Answer until the card on screen is one drawn from the unseen words
+	while progress.current.status(engine.entry) is not None:
+		engine.submit_guess(engine.entry.word)
+		engine.next()
+	on_screen = engine.entry
+	# Closed with a card on screen, without putting it back
+	storage.save(progress)
+	storage.close()
+	storage, progress = open_progress(kind, directory, vocabulary)
+	assert on_screen.id in [entry.id for _, entry, _ in progress.current.queue]
+	engine = GameEngine(progress)
+	for _ in range(1000):
+		if engine.state == 'complete':
+			break
+		if engine.state == 'solved':
+			engine.next()
+		engine.submit_guess(engine.entry.word)
+	assert engine.state == 'complete'
+	storage.close()
+
+@pytest.mark.parametrize('kind', ['journal', 'pickle', 'sqlite'])
+def test_put_back_card_is_dealt_first(deck, kind):
+	directory, vocabulary = deck
+	random.seed(5)
+	storage, progress = open_progress(kind, directory, vocabulary)
+	engine = GameEngine(progress)
+	# Words skipped and missed wait in the round queue, not due yet
+	engine.skip()
+	engine.give_up()
+	engine.next()
+	on_screen = engine.entry
+	progress.put_back(on_screen)
+	storage.save(progress)
+	storage.close()
+	storage, progress = open_progress(kind, directory, vocabulary)
+	assert GameEngine(progress).entry.id == on_screen.id
+	storage.close()
+
+def test_torn_checkpoint_is_cut_off(deck):
+	directory, vocabulary = deck
+	random.seed(3)
+	storage, progress = open_progress('journal', directory, vocabulary)
+	engine = GameEngine(progress)
+	play_rounds(engine, 10, random.Random(3), [2])
+	if engine.state == 'guessing':
+		progress.put_back(engine.entry)
+	storage.save(progress)
+	storage.close()
+	journal = directory / 'progress.journal'
+	written = journal.stat().st_size
+	storage, progress = open_progress('journal', directory, vocabulary)
+	before = state(progress)
+	engine = GameEngine(progress)
+	play_rounds(engine, 10, random.Random(4), [2])
+	storage.close()
+	# Crash in the middle of writing the last checkpoint
+	with open(journal, 'r+b') as f:
+		f.truncate(journal.stat().st_size - 5)
+	assert journal.stat().st_size > written
+	storage, progress = open_progress('journal', directory, vocabulary)
+	assert state(progress) == before
+	assert journal.stat().st_size == written
+	storage.close()
@@ -0,0 +1,29 @@
+import random
+from engine import GameEngine
+from wordentry import *
+
+def make_progress(n=100):
+	vocabulary = Vocabulary(WordEntry('word{}'.format(i), 'noun', 'meaning of word {}'.format(i),
+		'an example with word{}'.format(i), 'Common') for i in range(n))
+	return GameProgress(MasterSession(range(n)), vocabulary=vocabulary)
+
+def test_lapse_weight_lasts():
+	random.seed(2)
+	progress = make_progress()
+	engine = GameEngine(progress)
+	missed = engine.entry
+	engine.give_up()
+	engine.next()
+	assert progress.scheduler.weight(missed.id) == 2
+	# Answer every card until the missed word has been guessed twice
+	guessed = 0
+	for _ in range(1000):
+		if guessed == 2 or engine.state != 'guessing':
+			break
+		guessed += engine.entry is missed
+		engine.submit_guess(engine.entry.word)
+		if engine.state == 'solved':
+			engine.next()
+	assert guessed == 2
+	assert progress.current.status(missed) == 'known'
+	assert progress.current.known.weight(missed) == 2